@@ -0,0 +1,350 @@
+# beans_csv.py
+
+r'''Streaming access to files in the csv-app format used by beans.csv and Reconcile.csv.
+
+Each table is a line with the table name, a header line of "|" separated column names, then one
+line per row.  Tables are separated by a blank line.  Cells are padded with spaces.
+
+Nothing here loads the Tables, so these can be used on files of any size.
+
+Rows are converted by a function compiled for each table's stored columns (see row_converter).
+tables.load_csv_database uses these to load beans.csv.  Run beans-parse-bench to measure the
+parse and load rates.
+'''
+
+import csv
+from datetime import date, datetime
+from decimal import Decimal
+from functools import cache
+import os
+import tempfile
+import time
+
+from csv_app.row import Date_column
+
+
+Date_format = "%b %d, %y"
+
+
+Month_numbers = {date(2000, month, 1).strftime("%b"): month for month in range(1, 13)}
+
+
+@cache
+def parse_date(s):
+    r'''Parses a stripped date cell, e.g., "Nov 08, 25".
+
+    Slices the fields out directly when it can, rather than going through strptime.
+    '''
+    month = Month_numbers.get(s[:3])
+    if month is None or len(s) != 10 or s[3] != ' ' or s[6:8] != ', ':
+        return datetime.strptime(s, Date_format).date()
+    year = int(s[8:])
+    return date(year + (2000 if year < 69 else 1900), month, int(s[4:6]))   # same as %y
+
+
+def stored_columns(row_class):
+    return tuple(col for col in row_class.columns if not col.calculated)
+
+
+def converter(col):
+    r'''Returns the function to convert a stripped, non-empty cell for `col`.
+    '''
+    if isinstance(col, Date_column):
+        return parse_date
+    return col.parse or str
+
+
+class Row_error(ValueError):
+    r'''A row, or header, that can't be converted.  line_number is its line in the file.
+    '''
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        self.message = message
+        super().__init__(f"line {line_number}: {message}")
+
+
+class Headers(list):
+    r'''The stripped header cells of a table, with the line_number of the header line.
+    '''
+    def __init__(self, cells, line_number):
+        super().__init__(cell.strip() for cell in cells)
+        self.line_number = line_number
+
+
+def tables(file):
+    r'''Generates (table_name, headers, rows) for each table in the open `file`.
+
+    headers is a Headers list.  rows generates (line_number, cells) for each row of the table,
+    where cells are not stripped.  It is drained automatically when the next table is requested.
+    '''
+    reader = csv.reader(file, delimiter='|')
+    for cells in reader:
+        if not cells or not cells[0].strip():
+            continue
+        table_name = cells[0].strip()
+        headers = Headers(next(reader), reader.line_num)
+
+        def rows():
+            for cells in reader:
+                if not cells:
+                    return
+                yield reader.line_num, cells
+
+        rows = rows()
+        yield table_name, headers, rows
+        for _ in rows:
+            pass
+
+
+def row_converter(row_class, headers):
+    r'''Returns a function that converts the cells of one row into a {column_name: value} dict.
+
+    The function is generated for this row_class and header order, so that each cell is
+    stripped, checked for empty and converted in a single expression with no per-column looping.
+    Calculated columns are left out.  Empty (or missing) cells get the column's default.
+    '''
+    column_map = {col.name: col for col in row_class.columns}
+    namespace = {}
+    items = []
+    for i, header in enumerate(headers):
+        col = column_map[header]
+        if col.calculated:
+            continue
+        namespace[f"convert_{i}"] = converter(col)
+        namespace[f"default_{i}"] = col.default
+        items.append(f"{col.name!r}: convert_{i}(cell) if (cell := cells[{i}].strip()) "
+                     f"else default_{i}")
+    source = f"""
+def convert(cells):
+    if len(cells) < {len(headers)}:
+        cells = cells + [''] * ({len(headers)} - len(cells))
+    return {{{', '.join(items)}}}
+"""
+    exec(compile(source, f"<{row_class.__name__} row_converter>", "exec"), namespace)
+    return namespace["convert"]
+
+
+class Lazy_row:
+    r'''Holds the raw cells of one row, and decodes each stored column on first access.
+
+    The decoded value is then cached on the row, so later accesses are plain attribute lookups.
+    Rows that are never looked at cost little more than splitting their line.
+
+    Use lazy_row_class to get the subclass for a table.  Passing the table's row_class as a base
+    gives lazy rows that can go in the Tables (see tables.load_csv_database).  The attributes are
+    set with object.__setattr__, so a row class's own __setattr__ doesn't see them.
+    '''
+    decoders = {}   # {column_name: (cell index, converter, default)}
+
+    def __init__(self, cells):
+        object.__setattr__(self, "cells", cells)
+
+    def __getattr__(self, name):
+        try:
+            i, convert, default = self.decoders[name]
+        except KeyError:
+            raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}") \
+                  from None
+        cell = self.cells[i].strip() if i < len(self.cells) else ''
+        value = convert(cell) if cell else default
+        object.__setattr__(self, name, value)
+        return value
+
+
+def lazy_row_class(row_class, headers, *bases):
+    r'''Returns a Lazy_row subclass for row_class's stored columns in headers order.
+
+    bases are added after Lazy_row, e.g., to provide calculated columns.
+    '''
+    column_map = {col.name: col for col in row_class.columns}
+    decoders = {}
+    for i, header in enumerate(headers):
+        col = column_map[header]
+        if not col.calculated:
+            decoders[col.name] = i, converter(col), col.default
+    return type(f"Lazy_{row_class.__name__}", (Lazy_row,) + bases, dict(decoders=decoders))
+
+
+def bad_cell(row_class, headers, cells):
+    r'''Returns a message naming the first cell in `cells` that can't be converted.
+
+    This is the slow path, only used once a row has failed to convert.
+    '''
+    column_map = {col.name: col for col in row_class.columns}
+    for header, cell in zip(headers, cells):
+        col = column_map[header]
+        if col.calculated or not (cell := cell.strip()):
+            continue
+        try:
+            converter(col)(cell)
+        except (ValueError, ArithmeticError):
+            return f"can't convert {header} {cell!r}"
+    return "can't convert row"
+
+
+def read_rows(filename, row_class, table_name=None, errors=None):
+    r'''Generates (line_number, attrs) for each row of `table_name` in `filename`.
+
+    attrs is the {column_name: value} dict for the stored columns.  Reads the first table in the
+    file if table_name is None.
+
+    A cell that can't be converted, an unknown column in the header, or a file with no
+    `table_name` table, raises Row_error.  Or, if `errors` is a list, (line_number, message) is
+    appended to it and the row (or the whole table, for the header) is skipped.
+    '''
+    with open(filename, newline='') as file:
+        for name, headers, rows in tables(file):
+            if table_name is None or name == table_name:
+                yield from table_rows(row_class, headers, rows, errors)
+                return
+    if table_name is not None:
+        row_error(errors, 1, f"no {table_name} table")
+
+
+def row_error(errors, line_number, message):
+    r'''Raises Row_error, or appends (line_number, message) to errors if it's a list.
+    '''
+    if errors is None:
+        raise Row_error(line_number, message)
+    errors.append((line_number, message))
+
+
+def table_rows(row_class, headers, rows, errors=None):
+    r'''Generates (line_number, attrs) for the rows of one table from tables.
+
+    The errors are handled as in read_rows.
+    '''
+    column_names = frozenset(col.name for col in row_class.columns)
+    unknown = [header for header in headers if header not in column_names]
+    if unknown:
+        row_error(errors, headers.line_number, f"unknown column(s) {', '.join(map(repr, unknown))}")
+        return
+    convert = row_converter(row_class, headers)
+    for line_number, cells in rows:
+        try:
+            attrs = convert(cells)
+        except (ValueError, ArithmeticError):   # Decimal raises InvalidOperation
+            row_error(errors, line_number, bad_cell(row_class, headers, cells))
+            continue
+        yield line_number, attrs
+
+
+def last_table(filename):
+    r'''Returns (table_name, header_cells) for the last table in filename.
+
+    The header_cells are not stripped, so their lengths are the column widths.
+    '''
+    last = None, None
+    with open(filename, newline='') as file:
+        reader = csv.reader(file, delimiter='|')
+        starting_table = True
+        for cells in reader:
+            if not cells:
+                starting_table = True
+            elif starting_table:
+                last = cells[0].strip(), next(reader)
+                starting_table = False
+    return last
+
+
+def to_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, date):
+        return value.strftime(Date_format)
+    return str(value)
+
+
+def append_rows(filename, table_name, row_class, rows):
+    r'''Appends `rows` to the end of `filename`, without rewriting it.
+
+    This is only possible if table_name is the last table in the file; returns False, without
+    writing anything, if it isn't.  Numbers are right justified and everything else left justified
+    to the column widths in the table's header line.
+    '''
+    name, header_cells = last_table(filename)
+    if name != table_name:
+        return False
+    column_map = {col.name: col for col in row_class.columns}
+    columns = [column_map[cell.strip()] for cell in header_cells]
+    with open(filename, "r+b") as file:
+        # Keep the blank line(s) at the end of the file after the new rows.
+        end = file.seek(0, 2)
+        file.seek(max(0, end - 8))
+        tail = file.read()
+        trailing_newlines = len(tail) - len(tail.rstrip(b'\n'))
+        if trailing_newlines > 1:
+            file.truncate(end - trailing_newlines + 1)
+    with open(filename, "a", newline='') as file:
+        if end and not trailing_newlines:
+            file.write('\n')
+        for row in rows:
+            cells = []
+            for col, header_cell in zip(columns, header_cells):
+                value = getattr(row, col.name)
+                if isinstance(value, (int, Decimal)):
+                    cells.append(to_cell(value).rjust(len(header_cell)))
+                else:
+                    cells.append(to_cell(value).ljust(len(header_cell)))
+            file.write('|'.join(cells) + '\n')
+        file.write('\n' * (trailing_newlines - 1))
+    return True
+
+
+def synthetic_reconcile(filename, num_rows):
+    r'''Writes a Reconcile table with num_rows made up rows to filename.
+    '''
+    accounts = ("adv tickets", "door tickets", "50/50", "bf supplies", "meeting dinner", "cash")
+    first_day = date(2000, 1, 1).toordinal()
+    with open(filename, "w") as file:
+        file.write("Reconcile\n")
+        file.write("date      |account       |detail              |coin| b1|b5|b10|b20|b50|b100|donations\n")
+        for i in range(num_rows):
+            day = date.fromordinal(first_day + i // 20)
+            file.write(f"{day.strftime(Date_format)}|{accounts[i % len(accounts)]:14}|"
+                       f"{'detail ' + str(i % 97):20}|{i % 100 / 100:4}|{i % 31:3}|{i % 7:2}|"
+                       f"{i % 5:3}|{i % 11:3}|{i % 3:3}|{i % 2:4}|{i % 13:9}\n")
+        file.write("\n")
+
+
+def run():
+    r'''Measures the rows per second parsed from a synthetic Reconcile table, and loaded from it
+    into the Tables the way load_database loads beans.csv.
+    '''
+    import argparse
+
+    from .rows import Rows
+    from .tables import Tables, load_csv_database
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", "-r", type=int, default=1000000)
+
+    args = parser.parse_args()
+
+    row_class = {row_class.__name__: row_class for row_class in Rows}["Reconcile"]
+    with tempfile.TemporaryDirectory() as dirname:
+        filename = os.path.join(dirname, "Reconcile.csv")
+        synthetic_reconcile(filename, args.rows)
+
+        start = time.perf_counter()
+        with open(filename, newline='') as file:
+            for _, _, rows in tables(file):
+                for _ in rows:
+                    pass
+        split_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in read_rows(filename, row_class, "Reconcile"):
+            pass
+        parse_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_csv_database(filename)
+        load_time = time.perf_counter() - start
+        assert len(Tables["Reconcile"]) == args.rows, \
+               f"expected {args.rows} rows loaded, got {len(Tables['Reconcile'])}"
+
+    print(f"{args.rows} rows")
+    print(f"split only:      {split_time:7.3f} sec, {args.rows / split_time:10,.0f} rows/sec")
+    print(f"split + convert: {parse_time:7.3f} sec, {args.rows / parse_time:10,.0f} rows/sec")
+    print(f"load_database:   {load_time:7.3f} sec, {args.rows / load_time:10,.0f} rows/sec")
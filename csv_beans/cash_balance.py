@@ -9,6 +9,29 @@ r'''Appends to Reconcile table:
 import sys
 
 from .database import *
+from .table_writer import bills_writer
+
+
+def fold(rows):
+    r'''Folds rows, which start with a "cash", "w/starts" row, into the cash balance w/starts.
+
+    Returns the balance and the date of the last row.
+    '''
+    balance = rows[0].copy()
+    for recon in rows:
+        if recon.type == "Revenue":
+            balance += recon
+            if (start := Starts.start(recon.account)) is not None:
+                balance -= start
+        elif recon.type == "Expenses":
+            assert recon.donations == 0, \
+                   f"unexpected donations={recon.donations} on {recon.date:%b %d, %y}, {recon.account}, " \
+                   f"{recon.detail} expense"
+            balance -= recon
+        else:
+            assert recon.type in ("Bank", "Cash"), \
+                   f"Reconcile row {recon.date:%b %d, %y}, {recon.account} has unknown type {recon.type}"
+    return balance, recon.date
 
 
 def run():
@@ -19,11 +42,10 @@ def run():
 
     args = parser.parse_args()
 
-    load_database()
+    load_database(since="checkpoint")
 
     for i, recon in enumerate(reversed(Reconcile)):
         if recon.account == 'cash' and recon.detail == 'w/starts':
-            balance = recon.copy()
             next = len(Reconcile) - i - 1
             break
     else:
@@ -33,42 +55,27 @@ def run():
         print("Reconcile already ends in cash_balance -- aborting")
         return
 
-    for recon in Reconcile[next:]:
-        if recon.type == "Revenue":
-            balance += recon
-            if (recon.account, "start",) in Starts:
-                balance -= Starts[(recon.account, "start")]
-        elif recon.type == "Expenses":
-            assert recon.donations == 0, \
-                   f"unexpected donations={recon.donations} on {recon.date:%b %d, %y}, {recon.account}, " \
-                   f"{recon.detail} expense"
-            balance -= recon
-        else:
-            assert recon.type in ("Bank", "Cash"), \
-                   f"Reconcile row {recon.date:%b %d, %y}, {recon.account} has unknown type {recon.type}"
-
-    eff_date = recon.date
+    balance, eff_date = fold(Reconcile[next:])
 
     # Now balance should reflect our current cash, w/starts
-    balance_no_starts = balance.copy()
-
-    # Figure out the cash exchange:
-    starts = bills()
-    for start in Starts.values():
-        if start.detail == 'start':
-            balance_no_starts -= start
+    balance_no_starts = balance - Starts.start_bills()
 
     # insert monthly initial balance
+    start_index = len(Reconcile)
     Reconcile.insert(date=eff_date, account="cash", detail="w/o starts", **balance_no_starts.as_attrs())
     Reconcile.insert(date=eff_date, account="cash", detail="w/starts", **balance.as_attrs())
 
     # Give the user the results:
-    print("date      |account|detail    | coin| b1| b5|b10|b20|b50|b100|   total")
-    print(f"{eff_date:%b %d, %y}|cash   |w/o starts", end='')
-    balance_no_starts.print(file=sys.stdout)
-    print(f"{eff_date:%b %d, %y}|cash   |w/starts  ", end='')
-    balance.print(file=sys.stdout)
+    writer = bills_writer(label=("label", "date      |account|detail    "))
+    writer.write_header()
+    writer.write_rows((balance_no_starts, balance),
+                      (f"{eff_date:%b %d, %y}|cash   |w/o starts", f"{eff_date:%b %d, %y}|cash   |w/starts"))
 
     if not args.trial_run:
-        save_database()
+        try:
+            save_appended(start_index)
+        except Conflict_error as e:
+            print(e, file=sys.stderr)
+            print("Database not saved", file=sys.stderr)
+            sys.exit(1)
 
@@ -7,52 +7,49 @@ r'''
   - print out "cash out" and total
   - print out "cash in" and total
   - print out final bill counts and total
+
+The exchange is normally figured by plan_swap.  With --optimal, it's figured by optimal_swap,
+which finds the exchange with the fewest bills.
+
+With --simulate, nothing is recorded.  Instead, both are run against each historical "cash",
+"w/starts" balance in Reconcile, for each --minimums given (default the "cash", "minimums" in
+Starts), and a summary line is printed per minimums.
 '''
 
 from datetime import date
+from functools import lru_cache
 import math
 import sys
+from types import SimpleNamespace
 
 from .database import *
+from .table_writer import Out_column, Table_writer, bills_writer
 
 
-def run():
-    import argparse
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--trial-run", "-t", action="store_true", default=False)
-    parser.add_argument("--verbose", "-v", action="store_true", default=False)
-
-    args = parser.parse_args()
-
-    verbose = args.verbose
+Bill_names = tuple(col.name for col in bills.columns if not col.calculated)   # smallest first
 
-    load_database()
 
-    today = date.today()
+def surplus_limits():
+    r'''Returns {bill: n}, where n of the bill can be exchanged for the next larger bill that it
+    divides into.  The largest bill has no limit.
+    '''
+    limits = {}
+    for i, name in enumerate(Bill_names[:-1]):
+        larger = next(larger for larger in Bill_names[i + 1:]
+                      if bills.value(larger) % bills.value(name) == 0)
+        limits[name] = bills.value(larger) // bills.value(name)
+    return limits
 
-    last_recon = Reconcile[-1]
-    assert last_recon.account == "cash", f'Last Reconcile account must be "cash", not "{last_recon.account}"'
-    assert last_recon.detail == "w/starts", f'Last Reconcile detail must be "w/starts", not "{last_recon.detail}"'
-    initial_with_starts = last_recon.copy()
+Surplus_limits = surplus_limits()
 
-    # Figure out the cash exchange:
-    starts = bills()
-    for start in Starts.values():
-        if start.detail == 'start':
-            starts += start
 
-    initial_balance = initial_with_starts - starts   # ending_minimums don't include starts...
-    target = initial_balance.copy()
+def plan_swap(initial_balance, ending_minimums, verbose=False):
+    r'''Figures out the cash exchange to bring initial_balance (w/o starts) to ending_minimums.
 
-    ending_minimums = Starts["cash", "minimums"]
-    if verbose:
-        print("ending_minimums", end='')
-        ending_minimums.print_header(sys.stdout)
-        print("               ", end='')
-        ending_minimums.print(sys.stdout)
+    Returns cash_out, cash_in.  Nothing in the database is changed.
+    '''
+    target = initial_balance
 
-    # Figure out cash_out and cash_in:
     cash_out = bills()
     cash_in = bills()
 
@@ -140,8 +137,229 @@ def run():
 
     assert cash_in.total == cash_out.total, f"{cash_in.total=} != {cash_out.total=}"
 
+    return cash_out, cash_in
+
+
+def optimal_swap(initial_balance, ending_minimums):
+    r'''Figures out the exchange that needs the fewest bills to bring initial_balance (w/o
+    starts) to ending_minimums.
+
+    As with plan_swap, the final balance has at least the minimum of each bill, and no surplus
+    that could be exchanged for a larger bill (including 2 20s and a 10 for a 50).  Of the final
+    balances like that, this finds the one with the fewest bills in cash_out and cash_in.
+
+    Returns cash_out, cash_in; or None if the minimums can't be met.  Nothing in the database is
+    changed.
+    '''
+    have = tuple(getattr(initial_balance, name) for name in Bill_names)
+    minimums = tuple(getattr(ending_minimums, name) for name in Bill_names)
+    final = best_final(have, minimums, initial_balance.total)
+    if final is None:
+        return None
+    assert not exchangeable_surplus(final, minimums), \
+           f"optimal_swap left a surplus that should be exchanged, {final=}, {minimums=}"
+    cash_out = bills(**{name: max(h - f, 0) for name, h, f in zip(Bill_names, have, final)})
+    cash_in = bills(**{name: max(f - h, 0) for name, h, f in zip(Bill_names, have, final)})
+    return cash_out, cash_in
+
+
+def best_final(have, minimums, total):
+    r'''Returns the final counts (in Bill_names order) for optimal_swap, or None.
+
+    This is a dynamic program over the bills, smallest first.  Each bill may only go up to its
+    Surplus_limit over its minimum, so there are just a handful of choices per bill, and the
+    fewest bills exchanged for the rest of the bills is memoized on (bill, value left, whether
+    there is a surplus 10).
+    '''
+    if total < sum(bills.value(name) * m for name, m in zip(Bill_names, minimums)):
+        return None
+
+    # The coins are whatever fraction of a dollar is left, over their minimum.
+    coin = minimums[0] + (total - minimums[0]) % 1
+    last = len(Bill_names) - 1
+
+    @lru_cache(maxsize=None)
+    def fewest(i, value_left, surplus_b10):
+        r'''Returns (bills exchanged, counts for Bill_names[i:]) for value_left, or None.
+        '''
+        name = Bill_names[i]
+        value = bills.value(name)
+        if i == last:
+            count, leftover = divmod(value_left, value)
+            if leftover or count < minimums[i]:
+                return None
+            return abs(count - have[i]), (count,)
+        best = None
+        for count in range(minimums[i], minimums[i] + Surplus_limits[name]):
+            if count * value > value_left:
+                break
+            if name == "b20" and count - minimums[i] >= 2 and surplus_b10:
+                break   # 2 20s and a 10 would be exchanged for a 50
+            if name == "b10":
+                next_surplus_b10 = count > minimums[i]
+            elif name == "b20":
+                next_surplus_b10 = False     # doesn't matter after the 20s
+            else:
+                next_surplus_b10 = surplus_b10
+            rest = fewest(i + 1, value_left - count * value, next_surplus_b10)
+            if rest is not None:
+                exchanged = abs(count - have[i]) + rest[0]
+                if best is None or exchanged < best[0]:
+                    best = exchanged, (count,) + rest[1]
+        return best
+
+    best = fewest(1, int(total - coin), False)
+    if best is None:
+        return None
+    return (coin,) + best[1]
+
+
+def exchangeable_surplus(final, minimums):
+    r'''Returns the name of a bill in final (counts in Bill_names order) whose surplus over its
+    minimum should have been exchanged for a larger bill, or None.
+
+    "b20" also covers 2 surplus 20s and a surplus 10, which make a 50.
+    '''
+    surplus = {name: f - m for name, f, m in zip(Bill_names, final, minimums)}
+    for name, limit in Surplus_limits.items():
+        if surplus[name] >= limit:
+            return name
+    if surplus["b20"] >= 2 and surplus["b10"] >= 1:
+        return "b20"
+    return None
+
+
+def bills_exchanged(cash_out, cash_in):
+    r'''The number of bills (not coins) in cash_out and cash_in.
+    '''
+    return sum(getattr(cash_out, name) + getattr(cash_in, name) for name in Bill_names[1:])
+
+
+def meets(balance, ending_minimums):
+    return all(getattr(balance, name) >= getattr(ending_minimums, name) for name in Bill_names)
+
+
+def parse_minimums(s):
+    r'''Parses "coin,b1,b5,b10,b20,b50,b100" into bills.
+    '''
+    values = s.split(',')
+    if len(values) != len(Bill_names):
+        raise ValueError(f"expected {len(Bill_names)} comma separated values, got {s!r}")
+    return bills(Decimal(values[0]), *(int(value) for value in values[1:]))
+
+
+Simulate_columns = (
+    Out_column("minimums", "minimums                 ", "25"),
+    Out_column("balances", "balances", "8d"),
+    Out_column("greedy_short", "greedy short", "12d"),
+    Out_column("greedy_exchanged", "greedy bills", "12d"),
+    Out_column("optimal_short", "optimal short", "13d"),
+    Out_column("optimal_exchanged", "optimal bills", "13d"),
+    Out_column("fewer", "fewer", "5d"),
+)
+
+
+def simulate(balances, minimums_list):
+    r'''Runs plan_swap and optimal_swap on each balance (w/o starts) for each minimums.
+
+    Returns one SimpleNamespace per minimums with the Simulate_columns.  A balance is "short" if
+    the exchange leaves it under the minimums; the bills exchanged are only totaled for the
+    balances that aren't short.  "fewer" is the number of balances where optimal_swap exchanged
+    fewer bills than plan_swap.
+    '''
+    results = []
+    for minimums in minimums_list:
+        result = SimpleNamespace(minimums=','.join(str(getattr(minimums, name))
+                                                   for name in Bill_names),
+                                 balances=len(balances),
+                                 greedy_short=0, greedy_exchanged=0,
+                                 optimal_short=0, optimal_exchanged=0, fewer=0)
+        for balance in balances:
+            cash_out, cash_in = plan_swap(balance, minimums)
+            if meets(balance - cash_out + cash_in, minimums):
+                greedy = bills_exchanged(cash_out, cash_in)
+                result.greedy_exchanged += greedy
+            else:
+                greedy = None
+                result.greedy_short += 1
+            swap = optimal_swap(balance, minimums)
+            if swap is None:
+                result.optimal_short += 1
+            else:
+                optimal = bills_exchanged(*swap)
+                result.optimal_exchanged += optimal
+                if greedy is not None and optimal < greedy:
+                    result.fewer += 1
+        results.append(result)
+    return results
+
+
+def run_simulate(minimums_list):
+    load_database()
+    starts = Starts.start_bills()
+    balances = [recon.copy() - starts for recon in Reconcile
+                if recon.account == "cash" and recon.detail == "w/starts"]
+    if not minimums_list:
+        minimums_list = [Starts["cash", "minimums"]]
+    writer = Table_writer(Simulate_columns)
+    writer.write_header()
+    writer.write_rows(simulate(balances, minimums_list))
+
+
+def run():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trial-run", "-t", action="store_true", default=False)
+    parser.add_argument("--verbose", "-v", action="store_true", default=False)
+    parser.add_argument("--optimal", "-o", action="store_true", default=False,
+                        help="exchange the fewest bills, rather than using the usual rules")
+    parser.add_argument("--simulate", "-s", action="store_true", default=False,
+                        help="compare the usual rules with --optimal against the history; "
+                             "nothing is recorded")
+    parser.add_argument("--minimums", "-m", type=parse_minimums, action="append", default=[],
+                        metavar="COIN,B1,B5,B10,B20,B50,B100",
+                        help="with --simulate, may be repeated")
+
+    args = parser.parse_args()
+
+    if args.simulate:
+        run_simulate(args.minimums)
+        return
+
+    verbose = args.verbose
+
+    load_database(since="checkpoint")
+
+    today = date.today()
+
+    last_recon = Reconcile[-1]
+    assert last_recon.account == "cash", f'Last Reconcile account must be "cash", not "{last_recon.account}"'
+    assert last_recon.detail == "w/starts", f'Last Reconcile detail must be "w/starts", not "{last_recon.detail}"'
+    initial_with_starts = last_recon.copy()
+
+    # Figure out the cash exchange:
+    starts = Starts.start_bills()
+
+    initial_balance = initial_with_starts - starts   # ending_minimums don't include starts...
+
+    ending_minimums = Starts["cash", "minimums"]
+    if verbose:
+        print("ending_minimums", end='')
+        ending_minimums.print_header(sys.stdout)
+        print("               ", end='')
+        ending_minimums.print(sys.stdout)
+
+    if args.optimal:
+        swap = optimal_swap(initial_balance, ending_minimums)
+        assert swap is not None, f"can't meet the minimums with {initial_balance.total=}"
+        cash_out, cash_in = swap
+    else:
+        cash_out, cash_in = plan_swap(initial_balance, ending_minimums, verbose)
+
     # OK, now we have the calculated cash_out and cash_in!
 
+    start_index = len(Reconcile)
     Reconcile.insert(date=today, account="cash", detail="cash out", **cash_out.as_attrs())
     Reconcile.insert(date=today, account="cash", detail="cash in", **cash_in.as_attrs())
 
@@ -154,21 +372,12 @@ def run():
     Reconcile.insert(date=today, account="cash", detail="w/starts", **final_with_starts.as_attrs())
 
     # Give the user the results:
-    print("                | coin| b1| b5|b10|b20|b50|b100|   total")
-    print("have w/o starts ", end='')
-    initial_balance.print(file=sys.stdout)
-    print("have w/starts   ", end='')
-    initial_with_starts.print(file=sys.stdout)
-    print("cash out        ", end='')
-    cash_out.print(file=sys.stdout)
-    print("cash in         ", end='')
-    cash_in.print(file=sys.stdout)
-    print("final w/o starts", end='')
-    final_no_starts.print(file=sys.stdout)
-    print("minimums        ", end='')
-    ending_minimums.print(file=sys.stdout)
-    print("final w/starts  ", end='')
-    final_with_starts.print(file=sys.stdout)
+    writer = bills_writer(label=("label", "                "))
+    writer.write_header()
+    writer.write_rows((initial_balance, initial_with_starts, cash_out, cash_in, final_no_starts,
+                       ending_minimums, final_with_starts),
+                      ("have w/o starts", "have w/starts", "cash out", "cash in", "final w/o starts",
+                       "minimums", "final w/starts"))
 
     print()
     print("starts:", starts.total)
@@ -178,5 +387,10 @@ def run():
         print("Trial_run: Database not saved")
     else:
         print("Saving database")
-        save_database()
+        try:
+            save_appended(start_index)
+        except Conflict_error as e:
+            print(e, file=sys.stderr)
+            print("Database not saved", file=sys.stderr)
+            sys.exit(1)
 
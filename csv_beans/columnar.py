@@ -0,0 +1,142 @@
+# columnar.py
+
+r'''Exports Reconcile and Months as typed columns in NumPy .npz files, for analysis.
+
+  - dates are day ordinals (date.toordinal()), 0 for no date
+  - money (coin, donations, total) is integer cents
+  - bill counts are int32
+  - other ints (e.g., tickets_sold) are int32, with -1 for None
+  - strings (account, detail) are codes into a separate <column>_names array
+
+The .npz files are written uncompressed, so load_columnar can memory-map each column straight
+out of the file without parsing anything.
+
+Requires numpy (pip install csv-beans[columnar]).
+'''
+
+import os
+import struct
+import sys
+import zipfile
+
+from .database import *
+
+
+Bill_names = tuple(col.name for col in bills.columns if not col.calculated and col.name != "coin")
+
+
+def cents(amount):
+    r'''Converts a Decimal (or int) dollar amount to an int number of cents.
+    '''
+    amount_cents = amount * 100
+    assert amount_cents == int(amount_cents), f"{amount=} has fractional cents"
+    return int(amount_cents)
+
+
+def ordinal(d):
+    return 0 if d is None else d.toordinal()
+
+
+def int_or_minus_1(n):
+    return -1 if n is None else n
+
+
+def codes(np, values):
+    r'''Returns the codes array and the names array for the string `values`.
+    '''
+    index = {}
+    code_list = [index.setdefault(value or '', len(index)) for value in values]
+    return np.array(code_list, dtype=np.int32), np.array(list(index), dtype=str)
+
+
+def reconcile_columns(np):
+    rows = list(Reconcile)
+    columns = {}
+    columns["date"] = np.array([row.date.toordinal() for row in rows], dtype=np.int32)
+    for name in ("account", "detail"):
+        columns[name], columns[name + "_names"] = codes(np, [getattr(row, name) for row in rows])
+    columns["coin"] = np.array([cents(row.coin) for row in rows], dtype=np.int64)
+    for name in Bill_names:
+        columns[name] = np.array([getattr(row, name) for row in rows], dtype=np.int32)
+    for name in ("donations", "total"):
+        columns[name] = np.array([cents(getattr(row, name)) for row in rows], dtype=np.int64)
+    columns["tickets_sold"] = np.array([int_or_minus_1(row.tickets_sold) for row in rows],
+                                       dtype=np.int32)
+    return columns
+
+
+def months_columns(np):
+    rows = list(Months.values())
+    columns = {}
+    for name in ("month", "year"):
+        columns[name] = np.array([getattr(row, name) for row in rows], dtype=np.int16)
+    for name in ("start_date", "end_date", "meeting_date", "breakfast_date"):
+        columns[name] = np.array([ordinal(getattr(row, name)) for row in rows], dtype=np.int32)
+    for name in ("num_at_meeting", "staff_at_breakfast", "tickets_claimed", "meals_served"):
+        columns[name] = np.array([int_or_minus_1(getattr(row, name)) for row in rows],
+                                 dtype=np.int32)
+    return columns
+
+
+def export_columnar(dirname):
+    r'''Writes Reconcile.npz and Months.npz into dirname.  The database must be loaded.
+    '''
+    import numpy as np
+
+    os.makedirs(dirname, exist_ok=True)
+    for table_name, columns in (("Reconcile", reconcile_columns(np)),
+                                ("Months", months_columns(np))):
+        np.savez(os.path.join(dirname, table_name + ".npz"), **columns)
+
+
+def load_columnar(filename, mmap=True):
+    r'''Returns {column_name: array} for an .npz file written by export_columnar.
+
+    With mmap, each array is a read-only np.memmap onto its place in the file.
+    '''
+    import numpy as np
+
+    if not mmap:
+        with np.load(filename) as npz:
+            return {name: npz[name] for name in npz.files}
+    columns = {}
+    with zipfile.ZipFile(filename) as zip, open(filename, "rb") as file:
+        for info in zip.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED, \
+                   f"{filename}: {info.filename} is compressed, can't memory-map it"
+            # the local file header is 30 bytes, then the name and extra field
+            file.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", file.read(4))
+            file.seek(info.header_offset + 30 + name_len + extra_len)
+            if np.lib.format.read_magic(file) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            name = info.filename.removesuffix(".npy")
+            if 0 in shape:
+                columns[name] = np.empty(shape, dtype=dtype)    # can't mmap 0 bytes
+            else:
+                columns[name] = np.memmap(filename, dtype=dtype, mode='r', offset=file.tell(),
+                                          shape=shape, order='F' if fortran_order else 'C')
+    return columns
+
+
+def run():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--columnar", "-c", metavar="DIR", required=True,
+                        help="write Reconcile.npz and Months.npz into DIR")
+
+    args = parser.parse_args()
+
+    try:
+        import numpy
+    except ImportError:
+        print("beans-export --columnar requires numpy (pip install csv-beans[columnar])",
+              file=sys.stderr)
+        sys.exit(1)
+
+    load_database()
+    export_columnar(args.columnar)
+    print(f"Exported {len(Reconcile)} Reconcile rows and {len(Months)} Months rows to {args.columnar}")
@@ -0,0 +1,85 @@
+# comparative_report.py
+
+r'''Year-over-year comparison of the Cash Flow accounts for one month.
+
+Shows the selected month next to the same month in each of the previous N years, along with
+tickets_sold and the Months attendance figures and their averages.
+
+All of the years are totaled in one pass over Reconcile, grouped by (year, month, account).
+Each Reconcile row is put in the month whose start_date/end_date (in Months) covers its date, or
+in its calendar month when Months doesn't have dates for it (see Months.month_of).  The amounts are figured the same
+way as in the Treasurer's Report: Revenue less its start, with donations split out to
+"donations" or "bf donations".
+'''
+
+from collections import defaultdict
+import sys
+
+from .database import *
+
+
+Month_attrs = ("num_at_meeting", "staff_at_breakfast", "tickets_claimed", "meals_served")
+
+
+def group_totals(months):
+    r'''Returns {(year, month): {account: amount}} and {(year, month): {account: tickets_sold}}
+    for the (year, month)s in `months`, in one pass over Reconcile.
+    '''
+    amounts = defaultdict(lambda: defaultdict(int))
+    tickets = defaultdict(lambda: defaultdict(int))
+    for recon, key in zip(Reconcile, Months.months_of(recon.date for recon in Reconcile)):
+        if key not in months:
+            continue
+        month_amounts = amounts[key]
+        if recon.account.startswith("revenue") or recon.account.startswith("expense"):
+            month_amounts[recon.account] += recon.total
+            month_amounts["donations"] += recon.donations
+        elif recon.section == "Cash Flow":
+            month_amounts[recon.account] += recon.total - Starts.start_total(recon.account)
+            if recon.account.endswith(" tickets"):
+                tickets[key][recon.account] += recon.tickets_sold or 0
+            if recon.category == "Breakfast":
+                month_amounts["bf donations"] += recon.donations
+            else:
+                month_amounts["donations"] += recon.donations
+    return amounts, tickets
+
+
+def comparative_report(year, month, num_years, file=sys.stdout):
+    r'''Prints the comparison of `month` in `year` and the `num_years` years before it.
+    '''
+    keys = [(year - i, month) for i in range(num_years, -1, -1)]
+    amounts, tickets = group_totals(frozenset(keys))
+
+    label_width = max(len(account.account) for account in Accounts.values()) + 12
+    headers = [f"{abbr_month(m)} '{str(y)[2:]}" for y, m in keys]
+    col_width = max(10, *(len(header) for header in headers))
+    lines = []
+
+    def line(label, values, format="{:.2f}"):
+        cells = ('' if value is None else format.format(value) for value in values)
+        lines.append(f"{label:{label_width}}" + ''.join(f"|{cell:>{col_width}}" for cell in cells))
+
+    lines.append(f"{'Cash Flow':{label_width}}" + ''.join(f"|{header:>{col_width}}"
+                                                          for header in headers))
+    for type in ("Revenue", "Expenses"):
+        accounts = [account.account for account in Accounts.values()
+                    if account.section == "Cash Flow" and account.type == type]
+        lines.append(type)
+        for account in accounts:
+            line(f"  {account}", [amounts[key].get(account, 0) for key in keys])
+            if account.endswith(" tickets"):
+                line("    (tickets)", [tickets[key].get(account, 0) for key in keys], "{}")
+        line(f"  total {type.lower()}",
+             [sum(amounts[key].get(account, 0) for account in accounts) for key in keys])
+
+    lines.append("")
+    avg_header = f"{'avg ' + abbr_month(month):>{col_width}}"
+    lines.append(f"{'Attendance':{label_width}}" + ''.join(f"|{header:>{col_width}}"
+                                                           for header in headers)
+                 + f"|{avg_header}")
+    for attr in Month_attrs:
+        values = [getattr(Months[key], attr) if key in Months else None for key in keys]
+        line(f"  {attr}", values + [getattr(Months, "avg_" + attr)(month)], "{}")
+
+    print('\n'.join(lines), file=file)
@@ -0,0 +1,650 @@
+# equivalence.py
+
+r'''Checks that the optimized money calculations match a frozen reference, penny for penny.
+
+The reference is a copy of the original (unoptimized) rules, written against plain dicts read
+with its own simple parser, so that nothing done to speed up the package can change it:
+
+  - bills total, and Reconcile total (bills less donations)
+  - Reconcile tickets_sold (total less the account's start, over the ticket price, rounded up)
+  - the running cash balance: reset at each "cash", "w/starts" row, Revenue (less its start)
+    added and Expenses subtracted
+  - the Treasurer's Report lines for each closed month, totaled over its window of Reconcile
+    rows from the previous month's final balance up to (but not including) its own
+  - the cash_balance fold, from each "cash", "w/starts" row up to the next one
+  - the original cash_swap rules, on each "cash", "w/starts" balance
+
+Each of these is checked against the code that's used now:
+
+  parse        beans_csv.read_rows
+  totals       Reconcile.total and tickets_sold, on the loaded Tables
+  starts       Starts.start_bills
+  ledger       ledger.Ledger (total, tickets_sold and running balance for every row)
+  report       treasurer_report.find_final and window_totals
+  months       comparative_report.group_totals (against the same windows)
+  balances     cash_balance.fold (w/starts and w/o starts)
+  swap         cash_swap.plan_swap (only if Starts has "cash", "minimums")
+  columnar     columnar.reconcile_columns (only if numpy is installed)
+
+on the database, and on a generated history that uses the database's other tables.  Every value
+is compared, and the time of each is reported, along with how many times faster the current code
+is than the reference.  Exits with 1 if anything doesn't match.
+'''
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from .database import *
+from .beans_csv import read_rows
+from .table_writer import Out_column, Table_writer
+
+
+# The frozen reference:
+
+Ref_bill_values = (("coin", 1), ("b1", 1), ("b5", 5), ("b10", 10), ("b20", 20), ("b50", 50),
+                   ("b100", 100))
+
+Ref_dates = frozenset(("date", "start_date", "end_date"))
+Ref_decimals = frozenset(("coin", "donations", "decimal"))
+Ref_ints = frozenset(("b1", "b5", "b10", "b20", "b50", "b100", "month", "year", "int",
+                      "num_at_meeting", "staff_at_breakfast", "tickets_claimed"))
+Ref_zero_defaults = frozenset(name for name, _ in Ref_bill_values) | {"donations"}
+
+
+def ref_parse(name, cell):
+    cell = cell.strip()
+    if not cell:
+        return 0 if name in Ref_zero_defaults else None
+    if name in Ref_dates:
+        return datetime.strptime(cell, "%b %d, %y").date()
+    if name in Ref_decimals:
+        return Decimal(cell)
+    if name in Ref_ints:
+        return int(cell)
+    return cell
+
+
+def ref_read(filename):
+    r'''Returns {table_name: [{column_name: value}]}.
+    '''
+    tables = {}
+    with open(filename, newline='') as file:
+        lines = file.read().split('\n')
+    i = 0
+    while i < len(lines):
+        if not lines[i].strip():
+            i += 1
+            continue
+        table_name = lines[i].strip()
+        names = [name.strip() for name in lines[i + 1].split('|')]
+        rows = tables[table_name] = []
+        i += 2
+        while i < len(lines) and lines[i].strip():
+            rows.append({name: ref_parse(name, cell)
+                         for name, cell in zip(names, lines[i].split('|'))})
+            i += 1
+    return tables
+
+
+def ref_bills_total(row):
+    return sum(value * row[name] for name, value in Ref_bill_values)
+
+
+def ref_reconcile_total(row):
+    return ref_bills_total(row) - row["donations"]
+
+
+def ref_starts(tables):
+    return {row["account"]: row for row in tables["Starts"] if row["detail"] == "start"}
+
+
+def ref_start_bills(tables):
+    r'''Returns {bill: count} summed over all of the starts.
+    '''
+    starts = ref_starts(tables).values()
+    return {name: sum(row[name] for row in starts) for name, _ in Ref_bill_values}
+
+
+def ref_tickets_sold(row, prices, starts):
+    if not row["account"].endswith(" tickets"):
+        return None
+    price = prices[row["account"][:-1] + " price"]
+    total = ref_reconcile_total(row)
+    if row["account"] in starts:
+        total -= ref_bills_total(starts[row["account"]])
+    return int(math.ceil(total / price))
+
+
+def ref_balances(tables):
+    r'''Returns the running cash balance total after each Reconcile row (None before the first
+    "cash", "w/starts").
+    '''
+    types = {row["account"]: row["type"] for row in tables["Accounts"]}
+    starts = ref_starts(tables)
+    balance = None
+    balances = []
+    for row in tables["Reconcile"]:
+        if row["account"] == "cash" and row["detail"] == "w/starts":
+            balance = {name: row[name] for name, _ in Ref_bill_values}
+        elif balance is not None:
+            type = types.get(row["account"])
+            if type == "Revenue":
+                for name, _ in Ref_bill_values:
+                    balance[name] += row[name]
+                if row["account"] in starts:
+                    for name, _ in Ref_bill_values:
+                        balance[name] -= starts[row["account"]][name]
+            elif type == "Expenses":
+                for name, _ in Ref_bill_values:
+                    balance[name] -= row[name]
+        balances.append(None if balance is None else ref_bills_total(balance))
+    return balances
+
+
+def ref_find_final(rows, dates, end_date):
+    r'''Returns the index of the "cash", "w/starts" row ending end_date, or None.
+    '''
+    index = bisect_right(dates, end_date)
+    if index and rows[index - 1]["account"] == "cash" and rows[index - 1]["detail"] == "w/starts":
+        return index - 1
+    return None
+
+
+def ref_report_lines(tables):
+    r'''Returns the Treasurer's Report lines for each closed month, using its rules.
+
+    Each month is totaled from its previous month's final balance up to (but not including) its
+    own.  Returns {(year, month, line...): amount}, where line is one of:
+
+        "previous balance" and "cash" (the final balance)
+        "detail", account, detail   for the "revenue" and "expense" accounts
+        "amount", account           for the other Cash Flow accounts
+        "tickets", account
+    '''
+    accounts = {row["account"]: row for row in tables["Accounts"]}
+    prices = {row["name"]: row["int"] for row in tables["Globals"]}
+    starts = ref_starts(tables)
+    rows = tables["Reconcile"]
+    dates = [row["date"] for row in rows]
+    lines = {}
+
+    def add(key, amount):
+        lines[key] = lines.get(key, 0) + amount
+
+    for month_row in tables["Months"]:
+        if month_row["start_date"] is None or month_row["end_date"] is None:
+            continue
+        prev_index = ref_find_final(rows, dates, month_row["start_date"] - timedelta(days=1))
+        final_index = ref_find_final(rows, dates, month_row["end_date"])
+        if prev_index is None or final_index is None:
+            continue
+        key = month_row["year"], month_row["month"]
+        lines[(*key, "previous balance")] = ref_reconcile_total(rows[prev_index])
+        lines[(*key, "cash")] = ref_reconcile_total(rows[final_index])
+        for row in rows[prev_index:final_index]:
+            account = row["account"]
+            total = ref_reconcile_total(row)
+            if account.startswith("revenue") or account.startswith("expense"):
+                add((*key, "detail", account, row["detail"]), total)
+                add((*key, "amount", "donations"), row["donations"])
+            elif account in accounts and accounts[account]["section"] == "Cash Flow":
+                if account.endswith(" tickets"):
+                    add((*key, "tickets", account), ref_tickets_sold(row, prices, starts))
+                add((*key, "amount", account), total)
+                if account in starts:
+                    add((*key, "amount", account), -ref_bills_total(starts[account]))
+                if accounts[account]["category"] == "Breakfast":
+                    add((*key, "amount", "bf donations"), row["donations"])
+                else:
+                    add((*key, "amount", "donations"), row["donations"])
+    return lines
+
+
+def ref_checkpoints(tables):
+    r'''Returns [(start, end)] Reconcile index ranges, each from a "cash", "w/starts" row up to
+    the next one (or the end).
+    '''
+    indexes = [i for i, row in enumerate(tables["Reconcile"])
+               if row["account"] == "cash" and row["detail"] == "w/starts"]
+    return list(zip(indexes, indexes[1:] + [len(tables["Reconcile"])]))
+
+
+def ref_fold(tables, start, end):
+    r'''The cash_balance fold of Reconcile[start:end].
+
+    Returns ((w/starts bills), (w/o starts bills)), or the assertion message if it fails.
+    '''
+    types = {row["account"]: row["type"] for row in tables["Accounts"]}
+    starts = ref_starts(tables)
+    rows = tables["Reconcile"][start:end]
+    balance = {name: rows[0][name] for name, _ in Ref_bill_values}
+    for row in rows:
+        type = types.get(row["account"])
+        if type == "Revenue":
+            for name, _ in Ref_bill_values:
+                balance[name] += row[name]
+            if row["account"] in starts:
+                for name, _ in Ref_bill_values:
+                    balance[name] -= starts[row["account"]][name]
+        elif type == "Expenses":
+            if row["donations"] != 0:
+                return f"unexpected donations={row['donations']} on {row['date']:%b %d, %y}, " \
+                       f"{row['account']}, {row['detail']} expense"
+            for name, _ in Ref_bill_values:
+                balance[name] -= row[name]
+        elif type not in ("Bank", "Cash"):
+            return f"Reconcile row {row['date']:%b %d, %y}, {row['account']} has unknown type {type}"
+    start_bills = ref_start_bills(tables)
+    return (tuple(balance[name] for name, _ in Ref_bill_values),
+            tuple(balance[name] - start_bills[name] for name, _ in Ref_bill_values))
+
+
+def ref_swap(target, minimums):
+    r'''The original cash_swap rules: returns cash_out, cash_in as {bill: count}.
+    '''
+    names = [name for name, _ in Ref_bill_values]
+    values = dict(Ref_bill_values)
+    cash_out = dict.fromkeys(names, 0)
+    cash_in = dict.fromkeys(names, 0)
+
+    def next_bill(i):
+        return next(name for name in names[i + 1:] if values[name] % values[names[i]] == 0)
+
+    # rob from high bills to fill short bills
+    for i, key in enumerate(names[:-1]):
+        target_value = target[key] - cash_out[key]
+        if target_value < minimums[key]:
+            next_key = next_bill(i)
+            ratio = values[next_key] // values[key]
+            transfer = math.ceil((minimums[key] - target_value) / ratio)
+            cash_out[next_key] += transfer
+            cash_in[key] += ratio * transfer
+
+    # convert lower bills to higher bills
+    for i, key in enumerate(names[:-1]):
+        target_value = target[key] - cash_out[key] + cash_in[key]
+        if target_value > minimums[key]:
+            next_key = next_bill(i)
+            ratio = values[next_key] // values[key]
+            transfer = math.floor((target_value - minimums[key]) / ratio)
+            cash_out[key] += ratio * transfer
+            cash_in[next_key] += transfer
+            if key == "b20":
+                # 2 20s and 1 10 for a 50
+                target_value = target[key] - cash_out[key] + cash_in[key]
+                transfer = math.floor((target_value - minimums[key]) / 2)
+                extra_b10s = target["b10"] - cash_out["b10"] + cash_in["b10"] - minimums["b10"]
+                if extra_b10s > 0:
+                    t = min(transfer, extra_b10s)
+                    cash_out["b20"] += 2 * t
+                    cash_out["b10"] += t
+                    cash_in["b50"] += t
+
+    # cancel out the bills that go both ways
+    for name in names:
+        both = min(cash_out[name], cash_in[name])
+        cash_out[name] -= both
+        cash_in[name] -= both
+    return cash_out, cash_in
+
+
+# The checks.  Each returns (number of values compared, [mismatches], ref seconds, seconds).
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    ans = fn(*args)
+    return ans, time.perf_counter() - start
+
+
+def compare(expected, actual, label):
+    r'''Compares two equal length sequences.  Returns [mismatches].
+    '''
+    if len(expected) != len(actual):
+        return [f"{label}: {len(expected)} values expected, got {len(actual)}"]
+    return [f"{label}[{i}]: expected {e!r}, got {a!r}"
+            for i, (e, a) in enumerate(zip(expected, actual)) if e != a]
+
+
+def check_parse(filename, ref_tables, ref_seconds):
+    names = [col.name for col in Reconcile.row_class.columns if not col.calculated]
+    expected = [tuple(row[name] for name in names) for row in ref_tables["Reconcile"]]
+    rows, seconds = timed(lambda: [tuple(attrs[name] for name in names)
+                                   for _, attrs in read_rows(filename, Reconcile.row_class,
+                                                             "Reconcile")])
+    return len(expected), compare(expected, rows, "Reconcile row"), ref_seconds, seconds
+
+
+def check_totals(ref_tables):
+    prices = {row["name"]: row["int"] for row in ref_tables["Globals"]}
+
+    def ref():
+        starts = ref_starts(ref_tables)
+        return [(ref_reconcile_total(row), ref_tickets_sold(row, prices, starts))
+                for row in ref_tables["Reconcile"]]
+
+    expected, ref_seconds = timed(ref)
+    actual, seconds = timed(lambda: [(row.total, row.tickets_sold) for row in Reconcile])
+    return len(expected), compare(expected, actual, "(total, tickets_sold)"), ref_seconds, seconds
+
+
+def check_starts(ref_tables):
+    def ref():
+        start_bills = ref_start_bills(ref_tables)
+        return [start_bills[name] for name, _ in Ref_bill_values]
+
+    expected, ref_seconds = timed(ref)
+    Starts.invalidate()     # time figuring them, not the cached answer
+    total, seconds = timed(Starts.start_bills)
+    actual = [getattr(total, name) for name, _ in Ref_bill_values]
+    return len(expected), compare(expected, actual, "start bills"), ref_seconds, seconds
+
+
+def check_ledger(filename, ref_tables):
+    def ref():
+        prices = {row["name"]: row["int"] for row in ref_tables["Globals"]}
+        starts = ref_starts(ref_tables)
+        return [(ref_reconcile_total(row), ref_tickets_sold(row, prices, starts), balance)
+                for row, balance in zip(ref_tables["Reconcile"], ref_balances(ref_tables))]
+
+    from .ledger import Ledger
+
+    expected, ref_seconds = timed(ref)
+    actual, seconds = timed(lambda: [(row.total, row.tickets_sold, row.balance)
+                                     for row in Ledger(filename).rows()])
+    return len(expected), compare(expected, actual, "(total, tickets_sold, balance)"), \
+           ref_seconds, seconds
+
+
+def compare_keys(expected, actual, label):
+    r'''Compares two dicts.  Returns [mismatches].
+    '''
+    return [f"{label}{key}: expected {expected.get(key)!r}, got {actual.get(key)!r}"
+            for key in sorted(expected.keys() | actual.keys(), key=repr)
+            if expected.get(key) != actual.get(key)]
+
+
+def nonzero(lines):
+    return {key: value for key, value in lines.items() if value}
+
+
+def check_report(ref_lines, ref_seconds):
+    from .treasurer_report import find_final, window_totals
+
+    def actual_lines():
+        lines = {}
+        for month in Months.values():
+            if month.start_date is None or month.end_date is None:
+                continue
+            prev_end_date = month.start_date - timedelta(days=1)
+            if not Reconcile.last_date(prev_end_date):
+                continue
+            try:
+                prev_index, prev_balance = find_final(prev_end_date)
+                final_index, final_balance = find_final(month.end_date)
+            except AssertionError:
+                continue
+            key = month.year, month.month
+            lines[(*key, "previous balance")] = prev_balance.total
+            lines[(*key, "cash")] = final_balance.total
+            details, amounts, tickets = window_totals(prev_index, final_index)
+            lines.update(((*key, "detail", *detail), total) for detail, total in details.items())
+            lines.update(((*key, "amount", account), amount) for account, amount in amounts.items())
+            lines.update(((*key, "tickets", account), n) for account, n in tickets.items())
+        return lines
+
+    lines, seconds = timed(actual_lines)
+    return len(ref_lines), compare_keys(nonzero(ref_lines), nonzero(lines), "line"), \
+           ref_seconds, seconds
+
+
+def check_months(ref_lines, ref_seconds):
+    r'''The comparative report's per month totals against the Treasurer's Report windows.
+    '''
+    from .comparative_report import group_totals
+
+    expected = {}
+    for (year, month, kind, *line), value in ref_lines.items():
+        if kind in ("detail", "amount"):
+            key = year, month, line[0]
+            expected[key] = expected.get(key, 0) + value
+        elif kind == "tickets":
+            expected[year, month, "tickets", line[0]] = value
+
+    def actual_totals():
+        amounts, tickets = group_totals(frozenset((year, month) for year, month, *_ in ref_lines))
+        totals = {(*key, account): amount for key, month_amounts in amounts.items()
+                  for account, amount in month_amounts.items()}
+        totals.update(((*key, "tickets", account), n) for key, month_tickets in tickets.items()
+                      for account, n in month_tickets.items())
+        return totals
+
+    actual, seconds = timed(actual_totals)
+    return len(expected), compare_keys(nonzero(expected), nonzero(actual), "total"), \
+           ref_seconds, seconds
+
+
+def check_balances(ref_tables):
+    from .cash_balance import fold
+
+    checkpoints = ref_checkpoints(ref_tables)
+
+    def actual_balances():
+        names = [name for name, _ in Ref_bill_values]
+        balances = []
+        for start, end in checkpoints:
+            try:
+                balance, _ = fold(Reconcile[start:end])
+            except AssertionError as e:
+                balances.append(str(e))
+                continue
+            no_starts = balance - Starts.start_bills()
+            balances.append((tuple(getattr(balance, name) for name in names),
+                             tuple(getattr(no_starts, name) for name in names)))
+        return balances
+
+    expected, ref_seconds = timed(lambda: [ref_fold(ref_tables, start, end)
+                                           for start, end in checkpoints])
+    actual, seconds = timed(actual_balances)
+    return len(expected), compare(expected, actual, "(w/starts, w/o starts)"), \
+           ref_seconds, seconds
+
+
+def check_swap(ref_tables):
+    minimums = [row for row in ref_tables["Starts"]
+                if row["account"] == "cash" and row["detail"] == "minimums"]
+    if not minimums:
+        return None
+    from .cash_swap import plan_swap
+
+    names = [name for name, _ in Ref_bill_values]
+
+    def ref():
+        start_bills = ref_start_bills(ref_tables)
+        swaps = []
+        for start, _ in ref_checkpoints(ref_tables):
+            row = ref_tables["Reconcile"][start]
+            initial = {name: row[name] - start_bills[name] for name in names}
+            cash_out, cash_in = ref_swap(initial, minimums[0])
+            swaps.append(tuple(cash_out[name] for name in names)
+                         + tuple(cash_in[name] for name in names))
+        return swaps
+
+    def actual():
+        starts = Starts.start_bills()
+        ending_minimums = Starts["cash", "minimums"]
+        swaps = []
+        for recon in Reconcile:
+            if recon.account == "cash" and recon.detail == "w/starts":
+                cash_out, cash_in = plan_swap(recon.copy() - starts, ending_minimums)
+                swaps.append(tuple(getattr(cash_out, name) for name in names)
+                             + tuple(getattr(cash_in, name) for name in names))
+        return swaps
+
+    expected, ref_seconds = timed(ref)
+    actual_swaps, seconds = timed(actual)
+    return len(expected), compare(expected, actual_swaps, "(cash out, cash in)"), \
+           ref_seconds, seconds
+
+
+def check_columnar(ref_tables):
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    from .columnar import reconcile_columns, cents
+
+    expected, ref_seconds = timed(lambda: [cents(ref_reconcile_total(row))
+                                           for row in ref_tables["Reconcile"]])
+    columns, seconds = timed(reconcile_columns, np)
+    return len(expected), compare(expected, columns["total"].tolist(), "total cents"), \
+           ref_seconds, seconds
+
+
+def run_checks(filename):
+    r'''Generates (check_name, result) for each check on filename.
+    '''
+    ref_tables, ref_seconds = timed(ref_read, filename)
+    yield "parse", check_parse(filename, ref_tables, ref_seconds)
+    load_csv_database(filename)
+    yield "totals", check_totals(ref_tables)
+    yield "starts", check_starts(ref_tables)
+    yield "ledger", check_ledger(filename, ref_tables)
+    ref_lines, ref_seconds = timed(ref_report_lines, ref_tables)
+    yield "report", check_report(ref_lines, ref_seconds)
+    yield "months", check_months(ref_lines, ref_seconds)
+    yield "balances", check_balances(ref_tables)
+    if (result := check_swap(ref_tables)) is not None:
+        yield "swap", result
+    if (result := check_columnar(ref_tables)) is not None:
+        yield "columnar", result
+
+
+# The generated history:
+
+def generate_history(template, filename, num_rows, seed=0):
+    r'''Writes filename with all of the tables in template but Months and Reconcile, which are
+    replaced by made up ones.
+
+    Reconcile has num_rows made up rows, using the Revenue and Expenses accounts in template (with
+    no donations on the Expenses, as cash_balance requires).  There's a "cash", "w/starts" row
+    every 40 rows or so, and one on the last day of each month.  Months has each month, all but
+    the last closed.
+    '''
+    ref_tables = ref_read(template)
+    types = {row["account"]: row["type"] for row in ref_tables["Accounts"]}
+    accounts = [account for account, type in types.items() if type in ("Revenue", "Expenses")]
+    rng = random.Random(seed)
+    day = date(2000, 1, 1)
+    months = [SimpleNamespace(month=day.month, year=day.year, start_date=day, end_date=None)]
+    rows = []
+
+    def add_row(d, account, detail, scale, donations=0):
+        coin = Decimal(rng.randrange(500)) / 100
+        counts = [rng.randrange(scale) for _ in range(6)]
+        rows.append(f"{d.strftime('%b %d, %y')}|{account:14}|{detail:20}|"
+                    f"{coin:4}|{counts[0]:3}|{counts[1]:2}|{counts[2]:3}|{counts[3]:3}|"
+                    f"{counts[4]:3}|{counts[5]:4}|{donations:9}\n")
+
+    for i in range(num_rows):
+        if rng.random() < 0.2:
+            next_day = day + timedelta(days=1)
+            if next_day.month != day.month:
+                add_row(day, "cash", "w/starts", 20)        # the month's final balance
+                months[-1].end_date = day
+                months.append(SimpleNamespace(month=next_day.month, year=next_day.year,
+                                              start_date=next_day, end_date=None))
+            day = next_day
+        if i % 40 == 0:
+            add_row(day, "cash", "w/starts", 20)
+        else:
+            account = rng.choice(accounts)
+            donations = 0 if types[account] == "Expenses" \
+                          else rng.choice((0, 0, 0, 1, 5, Decimal("2.50")))
+            add_row(day, account, f"detail {rng.randrange(50)}", 3, donations)
+
+    def month_cell(month, header):
+        value = getattr(month, header.strip(), None)
+        if value is None:
+            return ''
+        if isinstance(value, date):
+            return value.strftime('%b %d, %y')
+        return str(value)
+
+    with open(template) as file_in, open(filename, "w") as file:
+        lines = iter(file_in)
+        for line in lines:
+            if line.strip() == "Reconcile":
+                break
+            file.write(line)
+            if line.strip() == "Months":
+                headers = next(lines)
+                file.write(headers)
+                for line in lines:      # skip template's months
+                    if not line.strip():
+                        break
+                for month in months:
+                    file.write('|'.join(month_cell(month, header)
+                                        for header in headers.rstrip('\n').split('|')) + '\n')
+                file.write('\n')
+        file.write("Reconcile\n")
+        file.write("date      |account       |detail              |coin| b1|b5|b10|b20|b50|b100|donations\n")
+        file.writelines(rows)
+        file.write("\n")
+
+
+Result_columns = (
+    Out_column("history", "history   ", "10"),
+    Out_column("check", "check   ", "8"),
+    Out_column("values", "  values", "8d"),
+    Out_column("mismatches", "mismatches", "10d"),
+    Out_column("ref_seconds", " ref secs", "9.3f"),
+    Out_column("seconds", "     secs", "9.3f"),
+    Out_column("speedup", "speedup", "7.1f"),
+)
+
+
+def run():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", "-d", default=Database_filename,
+                        help="must be a csv file (default %(default)s)")
+    parser.add_argument("--generate", "-g", type=int, default=20000, metavar="NUM_ROWS",
+                        help="rows in the generated history, 0 for none (default %(default)s)")
+    parser.add_argument("--seed", "-s", type=int, default=0)
+    parser.add_argument("--show", type=int, default=5,
+                        help="mismatches to show per check (default %(default)s)")
+
+    args = parser.parse_args()
+
+    histories = [("database", args.database)]
+    with tempfile.TemporaryDirectory() as dirname:
+        if args.generate:
+            generated = os.path.join(dirname, "generated.csv")
+            generate_history(args.database, generated, args.generate, args.seed)
+            histories.append(("generated", generated))
+        results = []
+        mismatches = []
+        for history, filename in histories:
+            for check, (num_values, errors, ref_seconds, seconds) in run_checks(filename):
+                results.append(SimpleNamespace(
+                                 history=history, check=check, values=num_values,
+                                 mismatches=len(errors), ref_seconds=ref_seconds,
+                                 seconds=seconds,
+                                 speedup=ref_seconds / seconds if seconds else None))
+                mismatches.extend(f"{history} {check}: {error}" for error in errors[:args.show])
+
+    writer = Table_writer(Result_columns)
+    writer.write_header()
+    writer.write_rows(results)
+    if mismatches:
+        print()
+        print('\n'.join(mismatches))
+        sys.exit(1)
@@ -0,0 +1,101 @@
+# import_bench.py
+
+r'''Import-time benchmark for the console scripts.
+
+Each script's module (from [project.scripts] in pyproject.toml) is imported in a fresh
+"python -X importtime" process, and its cumulative import time is checked against a budget.
+None of them may import the report/pdf machinery (csv_app.report) just to start up; that's only
+imported when a report is actually rendered.
+
+Exits with 1 if any script is over budget, or imports a forbidden module, so it can be used as
+a check.
+'''
+
+import os
+import subprocess
+import sys
+import tomllib
+
+
+Forbidden = ("csv_app.report",)
+
+Budget_ms = 250.0       # per script
+
+
+def script_modules(pyproject):
+    r'''Returns {script_name: module_name} from [project.scripts].
+    '''
+    with open(pyproject, "rb") as file:
+        scripts = tomllib.load(file)["project"]["scripts"]
+    return {name: entry_point.split(':')[0] for name, entry_point in scripts.items()}
+
+
+def import_times(module):
+    r'''Imports module in a fresh interpreter.
+
+    Returns {imported_module: cumulative microseconds} from python -X importtime, or None if the
+    import fails.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode:
+        return None
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench(module, repeat):
+    r'''Returns the fastest of repeat runs as (cumulative ms, set of modules imported), or None
+    if the import fails.
+    '''
+    best = None
+    for _ in range(repeat):
+        times = import_times(module)
+        if times is None:
+            return None
+        ms = times[module] / 1000
+        if best is None or ms < best[0]:
+            best = ms, set(times)
+    return best
+
+
+def run():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pyproject", "-p",
+                        default=os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                             "pyproject.toml"))
+    parser.add_argument("--budget", "-b", type=float, default=Budget_ms,
+                        help="milliseconds allowed per script (default %(default)s)")
+    parser.add_argument("--repeat", "-r", type=int, default=3,
+                        help="runs per script, the fastest is used (default %(default)s)")
+    parser.add_argument("scripts", nargs='*', help="default all of them")
+
+    args = parser.parse_args()
+
+    modules = script_modules(args.pyproject)
+    failed = False
+    print(f"{'script':20}|{'module':30}|      ms|")
+    for script in args.scripts or modules:
+        module = modules[script]
+        result = bench(module, args.repeat)
+        if result is None:
+            failed = True
+            print(f"{script:20}|{module:30}|        |import failed")
+            continue
+        ms, imported = result
+        problems = []
+        if ms > args.budget:
+            problems.append(f"over budget of {args.budget:.0f} ms")
+        problems.extend(f"imports {name}" for name in Forbidden if name in imported)
+        failed |= bool(problems)
+        print(f"{script:20}|{module:30}|{ms:8.1f}|{', '.join(problems)}")
+    if failed:
+        sys.exit(1)
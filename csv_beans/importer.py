@@ -0,0 +1,184 @@
+# importer.py
+
+r'''Streams Reconcile csv files into the Reconcile table.
+
+Each file is read in batches of at most `batch_size` rows.  Each batch is validated, sorted by
+date, checked for duplicates against a content-hash index of the Reconcile rows and then
+appended.  The per file summaries are printed as the rows are appended.
+'''
+
+from itertools import islice
+from types import SimpleNamespace
+import sys
+
+from .database import *
+from .beans_csv import read_rows
+from .validate import Key_indexes, Validation_error, check_rows
+
+
+Bill_names = tuple(col.name for col in bills.columns if not col.calculated)
+
+
+def near_key(row):
+    r'''Same date, account, detail (ignoring case and spacing) and denominations.
+    '''
+    detail = ' '.join((row.detail or '').split()).casefold()
+    return (row.date, row.account, detail) + tuple(getattr(row, name) for name in Bill_names)
+
+def exact_key(row):
+    return near_key(row) + (row.detail or '', row.donations)
+
+
+class Duplicate_index:
+    r'''Content-hash index over Reconcile rows.
+    '''
+    def __init__(self, rows=()):
+        self.exact = set()
+        self.near = set()
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        self.exact.add(exact_key(row))
+        self.near.add(near_key(row))
+
+    def check(self, row):
+        r'''Returns "exact", "near" or None.
+        '''
+        if exact_key(row) in self.exact:
+            return "exact"
+        if near_key(row) in self.near:
+            return "near"
+        return None
+
+
+class Summary:
+    r'''Prints each row added, and the total for the file.
+
+    ending_balance is a bills object that's updated for each row added, or None.  It is shared
+    by all of the files imported.
+    '''
+    def __init__(self, filename, ending_balance=None, file=sys.stdout):
+        self.filename = filename
+        self.ending_balance = ending_balance
+        self.file = file
+        self.total = 0
+        self.rows_added = 0
+        self.date_column = Reconcile.row_class.column_map['date']
+
+    def add(self, row):
+        file = self.file
+        self.rows_added += 1
+        print(f"{self.date_column.to_csv(row.date)}: {row.account}({row.detail}) = {row.total}",
+              end='', file=file)
+        if row.donations:
+            print(f", donations={row.donations}", file=file)
+        else:
+            print(file=file)
+        if row.type == "Revenue":
+            self.total += row.total
+            if self.ending_balance is not None:
+                self.ending_balance += row
+                if (starts_row := Starts.start(row.account)) is not None:
+                    self.ending_balance -= starts_row
+                    print(f"            - starts({starts_row.total}) = {row.total - starts_row.total}",
+                          file=file)
+                    self.total -= starts_row.total
+        elif row.type == "Expenses":
+            self.total -= row.total
+            if self.ending_balance is not None:
+                self.ending_balance -= row
+
+    def print(self):
+        print(f"{self.filename}: {self.rows_added} rows added, total {self.total}", file=self.file)
+
+
+class Importer:
+    r'''Appends the rows from one or more Reconcile csv files to the Reconcile table.
+
+    Raises Validation_error on the first batch with errors.  Nothing is saved here, so the
+    caller can simply not save the database in that case.
+    '''
+    def __init__(self, batch_size=1000, allow_near_duplicates=False, ending_balance=None,
+                 file=sys.stdout):
+        self.batch_size = batch_size
+        self.allow_near_duplicates = allow_near_duplicates
+        self.ending_balance = ending_balance
+        self.file = file
+        self.indexes = Key_indexes()
+        self.last_date = Reconcile[-1].date if len(Reconcile) else None
+        # Rows dated before last_date are rejected, so only the rows on or after it can be
+        # duplicated.  (And the earlier ones may be lazy, see load_database.)
+        self.duplicates = Duplicate_index(Reconcile[Reconcile.find_date(self.last_date):]
+                                          if self.last_date is not None else ())
+        self.skipped = 0
+
+    def import_files(self, filenames):
+        r'''Returns a list of the Summary for each file.
+        '''
+        return [self.import_file(filename) for filename in filenames]
+
+    def import_file(self, filename):
+        print("Copying", filename, "into database", file=self.file)
+        summary = Summary(filename, self.ending_balance, self.file)
+        errors = []
+        rows = read_rows(filename, Reconcile.row_class, "Reconcile", errors)
+        while batch := list(islice(rows, self.batch_size)):
+            if errors:
+                for _ in rows:      # to report all of the bad rows
+                    pass
+                break
+            self.import_batch(filename, batch, summary)
+        if errors:
+            raise Validation_error(filename, errors)
+        summary.print()
+        return summary
+
+    def check_file(self, filename):
+        r'''Raises Validation_error if any batch in filename would be rejected.
+
+        Does not change anything, so this can be used to check a whole file before importing any
+        of it.
+        '''
+        errors = []
+        rows = read_rows(filename, Reconcile.row_class, "Reconcile", errors)
+        last_date = self.last_date
+        while batch := list(islice(rows, self.batch_size)):
+            numbered_rows = [(line_number, SimpleNamespace(**attrs)) for line_number, attrs in batch]
+            errors.extend(self.check_batch(numbered_rows, last_date))
+            dates = [row.date for _, row in numbered_rows if row.date is not None]
+            if dates:
+                last_date = max(dates)
+        if errors:
+            errors.sort()
+            raise Validation_error(filename, errors)
+
+    def check_batch(self, numbered_rows, last_date):
+        r'''Returns a sorted list of (line_number, message) for the errors in numbered_rows.
+        '''
+        errors = check_rows("Reconcile", numbered_rows, self.indexes)
+        if last_date is not None:
+            errors.extend((line_number, f"dated before {last_date:%b %d, %y}")
+                          for line_number, row in numbered_rows
+                           if row.date is not None and row.date < last_date)
+        errors.sort()
+        return errors
+
+    def import_batch(self, filename, batch, summary):
+        r'''batch is a list of (line_number, attrs).
+        '''
+        numbered_rows = [(line_number, SimpleNamespace(**attrs)) for line_number, attrs in batch]
+        if errors := self.check_batch(numbered_rows, self.last_date):
+            raise Validation_error(filename, errors)
+        numbered_rows.sort(key=lambda numbered_row: numbered_row[1].date)
+        for line_number, row in numbered_rows:
+            duplicate = self.duplicates.check(row)
+            if duplicate == "exact" or duplicate == "near" and not self.allow_near_duplicates:
+                print(f"{filename}({line_number}): skipping {duplicate} duplicate: "
+                      f"{row.date:%b %d, %y} {row.account}({row.detail})", file=self.file)
+                self.skipped += 1
+                continue
+            Reconcile.insert(**vars(row))
+            self.duplicates.add(row)
+            summary.add(Reconcile[-1])
+        self.last_date = numbered_rows[-1][1].date
@@ -0,0 +1,209 @@
+# ledger.py
+
+r'''Streams the Reconcile table, with its calculated columns and a running cash balance.
+
+The rows are read straight from the database file (csv or sqlite), and written out in batches,
+so this runs in constant memory no matter how long the history is.
+
+The running balance follows the same rules as cash_balance: it's reset at each "cash",
+"w/starts" row, Revenue (less its start) is added and Expenses are subtracted.
+
+The Reconcile rows are lazy (see beans_csv.Lazy_row).  With --start, the rows before the last
+checkpoint ahead of the start date never have their bills decoded.
+'''
+
+from datetime import date
+from itertools import islice
+import math
+import sys
+
+from .rows import bills, Rows, Database_filename, Sqlite_suffixes
+from .beans_csv import tables, row_converter, lazy_row_class, parse_date
+from .table_writer import Out_column, Table_writer, Bills_columns, Formats
+
+
+Row_classes = {row_class.__name__: row_class for row_class in Rows}
+
+Bill_names = tuple(col.name for col in bills.columns if not col.calculated)
+
+Ledger_columns = (
+    Out_column("date", "date      ", "%b %d, %y"),
+    Out_column("account", "account       ", "14"),
+    Out_column("detail", "detail              ", "20"),
+) + Bills_columns[:-1] + (
+    Out_column("donations", "  don", "5"),
+) + Bills_columns[-1:] + (
+    Out_column("section", "section  ", "9"),
+    Out_column("category", "category       ", "15"),
+    Out_column("type", "type    ", "8"),
+    Out_column("tickets_sold", "tkts", "4"),
+    Out_column("balance", " balance", "8.02f"),
+)
+
+
+class Ledger_row(bills):
+    r'''Mixed into the lazy Reconcile rows.  The stored columns come from the Lazy_row.
+    '''
+    @property
+    def total(self):
+        r'''Includes Start amount.
+        '''
+        return super().total - self.donations
+
+
+class Stored_row(Ledger_row):
+    r'''A Reconcile row read from sqlite, which is already converted.
+    '''
+    def __init__(self, attrs):
+        self.__dict__.update(attrs)
+
+
+class Ledger:
+    r'''Reads the small tables from the database file, then generates the Reconcile rows.
+
+    Only the small tables (Accounts, Globals, Starts) are held in memory.
+    '''
+    def __init__(self, filename=Database_filename):
+        self.filename = filename
+        self.accounts = {}      # {account: Accounts attrs}
+        self.prices = {}        # {Globals name: int}
+        self.starts = {}        # {account: bills of the "start" row}
+        self.balance = None
+
+    def rows(self, start_date=None, end_date=None, accounts=None):
+        r'''Generates a Ledger_row for each selected Reconcile row.
+
+        The running balance is computed over all of the rows, whether selected or not.
+        '''
+        if self.filename.endswith(Sqlite_suffixes):
+            yield from self.sqlite_rows(start_date, end_date, accounts)
+            return
+        with open(self.filename, newline='') as file:
+            for table_name, headers, rows in tables(file):
+                if table_name == "Reconcile":
+                    row_class = lazy_row_class(Row_classes["Reconcile"], headers, Ledger_row)
+                    yield from self.reconcile_rows((row_class(cells) for _, cells in rows),
+                                                   start_date, end_date, accounts)
+                    return
+                convert = row_converter(Row_classes[table_name], headers)
+                for _, cells in rows:
+                    self.add_small_row(table_name, convert(cells))
+
+    def sqlite_rows(self, start_date, end_date, accounts):
+        r'''Like rows, but streams them from an sqlite database (in id order).
+        '''
+        from .sqlite_store import Sqlite_database
+
+        store = Sqlite_database(self.filename)
+        try:
+            for table_name in ("Accounts", "Globals", "Starts"):
+                for attrs in store.select(table_name):
+                    self.add_small_row(table_name, attrs)
+            yield from self.reconcile_rows(map(Stored_row, store.select("Reconcile")),
+                                           start_date, end_date, accounts)
+        finally:
+            store.close()
+
+    def add_small_row(self, table_name, attrs):
+        if table_name == "Accounts":
+            self.accounts[attrs["account"]] = attrs
+        elif table_name == "Globals":
+            self.prices[attrs["name"]] = attrs["int"]
+        elif table_name == "Starts" and attrs["detail"] == "start":
+            self.starts[attrs["account"]] = bills(**{name: attrs[name] for name in Bill_names})
+
+    def reconcile_rows(self, rows, start_date, end_date, accounts):
+        self.balance = None
+        unfolded = []   # rows before start_date, from the last checkpoint on
+        for row in rows:
+            if end_date is not None and row.date > end_date:
+                return
+            self.classify(row)
+            if start_date is not None and row.date < start_date:
+                # Only the rows from the last checkpoint on matter to the balance at start_date.
+                if row.account == "cash" and row.detail == "w/starts":
+                    unfolded = [row]
+                elif unfolded:
+                    unfolded.append(row)
+                continue
+            if unfolded:
+                for earlier_row in unfolded:
+                    self.fold(earlier_row)
+                unfolded = []
+            self.fold(row)
+            if accounts is None or row.account in accounts:
+                self.add_tickets_sold(row)
+                yield row
+
+    def classify(self, row):
+        r'''Sets section, category and type from Accounts.
+        '''
+        account = self.accounts.get(row.account)
+        if account is None:
+            row.section = row.category = row.type = None
+        else:
+            row.section = account["section"]
+            row.category = account["category"]
+            row.type = account["type"]
+
+    def fold(self, row):
+        r'''Folds row into the running balance, and sets row.balance.
+        '''
+        if row.account == "cash" and row.detail == "w/starts":
+            self.balance = row.copy()
+        elif self.balance is not None:
+            if row.type == "Revenue":
+                self.balance += row
+                if (start := self.starts.get(row.account)) is not None:
+                    self.balance -= start
+            elif row.type == "Expenses":
+                self.balance -= row
+        row.balance = None if self.balance is None else self.balance.total
+
+    def add_tickets_sold(self, row):
+        row.tickets_sold = None
+        if row.account.endswith(" tickets"):
+            price = self.prices.get(row.account[:-1] + " price")
+            if price is not None:
+                total = row.total
+                if (start := self.starts.get(row.account)) is not None:
+                    total -= start.total
+                row.tickets_sold = int(math.ceil(total / price))
+
+
+def parse_date_arg(s):
+    r'''Accepts either YYYY-MM-DD or the database format (e.g., "Nov 08, 25").
+    '''
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        return parse_date(s)
+
+
+def run():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", "-f", choices=Formats, default="text",
+                        help="json is json lines")
+    parser.add_argument("--output", "-o", default=None, help="default stdout")
+    parser.add_argument("--start", "-s", type=parse_date_arg, default=None)
+    parser.add_argument("--end", "-e", type=parse_date_arg, default=None)
+    parser.add_argument("--account", "-a", action="append", default=None,
+                        help="may be repeated")
+    parser.add_argument("--database", "-d", default=Database_filename)
+    parser.add_argument("--batch-size", "-b", type=int, default=10000)
+
+    args = parser.parse_args()
+
+    buffer_size = 1 << 20
+    if args.output is None:
+        file = open(sys.stdout.fileno(), "w", buffering=buffer_size, newline='', closefd=False)
+    else:
+        file = open(args.output, "w", buffering=buffer_size, newline='')
+    with file:
+        writer = Table_writer(Ledger_columns, args.format, file)
+        writer.write_header()
+        rows = Ledger(args.database).rows(args.start, args.end, args.account)
+        while batch := list(islice(rows, args.batch_size)):
+            writer.write_rows(batch)
@@ -0,0 +1,97 @@
+# locking.py
+
+r'''File locking, atomic saves and version stamps for the database file.
+
+  - lock(filename, exclusive) takes an advisory lock on "<filename>.lock": shared to load the
+    database, exclusive to save it.  (The lock file is used, rather than the database file itself,
+    because saves replace the database file.)
+  - atomic_save writes the new database to a temp file in the same directory, fsyncs it, and
+    renames it over the old one, so a crash part way through a save leaves the old file intact.
+  - version(filename) is a stamp of the file's contents, taken at load, so that a save can tell
+    whether someone else has saved since.
+
+Locking needs fcntl, so it's a no-op on systems that don't have it.
+'''
+
+from contextlib import contextmanager
+from hashlib import sha256
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class Conflict_error(Exception):
+    r'''The database was changed by someone else since it was loaded, in a way that can't be
+    merged.
+    '''
+    pass
+
+
+@contextmanager
+def lock(filename, exclusive=False):
+    with open(filename + ".lock", "a") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def version(filename):
+    r'''Returns (mtime_ns, size, sha256 hexdigest) of filename, or None if it doesn't exist.
+    '''
+    try:
+        with open(filename, "rb") as file:
+            stat = os.fstat(file.fileno())
+            return stat.st_mtime_ns, stat.st_size, sha256(file.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def same_version(filename, stamp):
+    r'''Is filename still at version stamp?
+
+    A changed mtime or size with the same contents (e.g., the file was touched) is still the
+    same version.
+    '''
+    if stamp is None:
+        return not os.path.exists(filename)
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return False
+    if (stat.st_mtime_ns, stat.st_size) == stamp[:2]:
+        return True
+    current = version(filename)
+    return current is not None and current[2] == stamp[2]
+
+
+def atomic_save(filename, save):
+    r'''Calls save(temp_filename), then fsyncs the temp file and renames it to filename.
+    '''
+    dirname = os.path.dirname(os.path.abspath(filename))
+    temp = os.path.join(dirname, f".{os.path.basename(filename)}.{os.getpid()}.tmp")
+    try:
+        save(temp)
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp)
+        with open(temp, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(temp, filename)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # make the rename itself durable
+        fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -5,8 +5,7 @@ r'''Stores num_at_meeting in current Month.
 
 import sys
 
-sys.path.append('.')
-from database import *
+from .database import *
 
 
 def run():
@@ -55,7 +54,12 @@ def run():
 
     if not args.trial_run:
         print("Saving Database")
-        save_database()
+        try:
+            save_database()
+        except Conflict_error as e:
+            print(e, file=sys.stderr)
+            print("Database not saved", file=sys.stderr)
+            sys.exit(1)
     else:
         print("Trial_run: Database not saved")
 
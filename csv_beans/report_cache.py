@@ -0,0 +1,77 @@
+# report_cache.py
+
+r'''Cache of rendered Treasurer's Reports for closed months.
+
+A cache entry is keyed on (year, month) and a fingerprint of everything that goes into the
+report: the month's Months row, the Reconcile rows from the previous month's final balance through
+this month's final balance, and all of Accounts, Starts and Globals.  Editing any of those gives
+a new fingerprint, so stale entries are simply never found again.
+
+The fingerprint also includes Cache_format, which must be bumped whenever a change to
+treasurer_report (or csv_app.report) changes what's rendered, so that reports cached by the old
+code aren't used.
+'''
+
+from hashlib import sha256
+import os
+import shutil
+
+from .database import *
+
+
+Cache_format = 1
+
+
+def fingerprint(month_row, reconcile_rows):
+    r'''Returns the hex sha256 of the stored values of all of the rows the report depends on.
+    '''
+    h = sha256(f"T-Report format {Cache_format}\0".encode())
+
+    def add(rows):
+        for row in rows:
+            h.update(repr(stored_values(row)).encode())
+        h.update(b'\0')   # table separator
+
+    add((month_row,))
+    add(reconcile_rows)
+    for table in (Accounts, Starts, Globals):
+        add(table.values())
+    return h.hexdigest()
+
+
+class Report_cache:
+    def __init__(self, dirname=None):
+        if dirname is None:
+            dirname = os.path.join(os.path.dirname(Database_filename), ".report_cache")
+        self.dirname = dirname
+
+    def path(self, year, month, fingerprint, ext):
+        return os.path.join(self.dirname, f"T-Report-{year}-{month:02d}-{fingerprint[:32]}.{ext}")
+
+    def get_text(self, year, month, fingerprint):
+        r'''Returns the cached text, or None.
+        '''
+        try:
+            with open(self.path(year, month, fingerprint, "txt")) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put_text(self, year, month, fingerprint, text):
+        os.makedirs(self.dirname, exist_ok=True)
+        with open(self.path(year, month, fingerprint, "txt"), "w") as file:
+            file.write(text)
+
+    def get_pdf(self, year, month, fingerprint, pdf_filename):
+        r'''Copies the cached pdf to pdf_filename.  Returns True if it was in the cache.
+        '''
+        path = self.path(year, month, fingerprint, "pdf")
+        if not os.path.exists(path):
+            return False
+        shutil.copyfile(path, pdf_filename)
+        return True
+
+    def put_pdf(self, year, month, fingerprint, pdf_filename):
+        if os.path.exists(pdf_filename):
+            os.makedirs(self.dirname, exist_ok=True)
+            shutil.copyfile(pdf_filename, self.path(year, month, fingerprint, "pdf"))
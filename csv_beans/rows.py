@@ -1,11 +1,42 @@
 # rows.py
 
+from collections import namedtuple
+from functools import lru_cache
 import math
+import os
 
 from csv_app.row import *
 from csv_app.table import Database, set_database_filename
 
-set_database_filename("beans.csv")
+# May be overridden by the BEANS_DATABASE environment variable.  Names ending in .sqlite or .db
+# are sqlite databases (see sqlite_store.py).
+Database_filename = os.environ.get("BEANS_DATABASE", "beans.csv")
+
+Sqlite_suffixes = (".sqlite", ".db")
+
+set_database_filename(Database_filename)
+
+
+Off_season = frozenset(range(5, 10))     # May-Sep, no meetings
+
+Month_calendar = namedtuple("Month_calendar",
+                            "year month meeting_date breakfast_date month_str in_season")
+
+
+@lru_cache(maxsize=None)
+def nth_day(year, month, n, day):
+    r'''Returns the date of the nth `day` (e.g., TUESDAY) in the month.
+    '''
+    firstday = date(year, month, 1).weekday()
+    days_to_day = day - firstday
+    if days_to_day >= 0:
+        return date(year, month, days_to_day + 1 + 7 * (n - 1))
+    return date(year, month, days_to_day + 8 + 7 * (n - 1))
+
+@lru_cache(maxsize=None)
+def month_calendar(year, month):
+    return Month_calendar(year, month, nth_day(year, month, 1, TUESDAY), nth_day(year, month, 2, SATURDAY),
+                          f"{abbr_month(month)} '{str(year)[2:]}", month not in Off_season)
 
 
 class Months(Row):
@@ -24,9 +55,17 @@ class Months(Row):
     )
     primary_keys = "year", "month"
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        Database.Months.invalidate()   # the dates of the month may have changed
+
+    @property
+    def calendar(self):
+        return month_calendar(self.year, self.month)
+
     @property
     def month_str(self):
-        return f"{abbr_month(self.month)} '{str(self.year)[2:]}"
+        return self.calendar.month_str
 
     @property
     def prev_month(self):
@@ -44,18 +83,14 @@ class Months(Row):
 
     @property
     def meeting_date(self):
-        return self.nth_day(1, TUESDAY)
+        return self.calendar.meeting_date
 
     @property
     def breakfast_date(self):
-        return self.nth_day(2, SATURDAY)
+        return self.calendar.breakfast_date
 
     def nth_day(self, n, day):
-        firstday = date(self.year, self.month, 1).weekday()
-        days_to_day = day - firstday
-        if days_to_day >= 0:
-            return date(self.year, self.month, days_to_day + 1 + 7 * (n - 1))
-        return date(self.year, self.month, days_to_day + 8 + 7 * (n - 1))
+        return nth_day(self.year, self.month, n, day)
 
 class Globals(Row):
     columns = (
@@ -91,6 +126,20 @@ class bills:
         Column("total", parse=Decimal, calculated=True),
     )
 
+    # text output: (name, header, format spec) for each of the columns
+    text_columns = (
+        ("coin", " coin", "5.02f"),
+        ("b1", " b1", "3d"),
+        ("b5", " b5", "3d"),
+        ("b10", "b10", "3d"),
+        ("b20", "b20", "3d"),
+        ("b50", "b50", "3d"),
+        ("b100", "b100", "4d"),
+        ("total", "   total", "8.02f"),
+    )
+    text_header = ''.join(f"|{header}" for _, header, _ in text_columns)
+    text_format = ''.join(f"|{{0.{name}:{spec}}}" for name, _, spec in text_columns)
+
     @property
     def bill_columns(self):
         return (col for col in bills.columns if not col.calculated)
@@ -166,28 +215,14 @@ class bills:
 
         Terminates the line.
         '''
-        print("| coin", end='', file=file)
-        print("| b1", end='', file=file)
-        print("| b5", end='', file=file)
-        print("|b10", end='', file=file)
-        print("|b20", end='', file=file)
-        print("|b50", end='', file=file)
-        print("|b100", end='', file=file)
-        print("|total", file=file)
+        print(bills.text_header, file=file)
 
     def print(self, file):
         r'''Appends bill columns to end of current print line.
 
         Terminates the line.
         '''
-        print(f"|{self.coin:5.02f}", end='', file=file)
-        print(f"|{self.b1:3d}", end='', file=file)
-        print(f"|{self.b5:3d}", end='', file=file)
-        print(f"|{self.b10:3d}", end='', file=file)
-        print(f"|{self.b20:3d}", end='', file=file)
-        print(f"|{self.b50:3d}", end='', file=file)
-        print(f"|{self.b100:4d}", end='', file=file)
-        print(f"|{self.total:8.02f}", file=file)
+        print(bills.text_format.format(self), file=file)
 
 class Starts(Row, bills):  # row first, so it's __init__ is used.
     # If columns are added or deleted, you'll need to redo Reconcile.columns!
@@ -202,6 +237,10 @@ class Starts(Row, bills):  # row first, so it's __init__ is used.
     primary_keys = "account", "detail"
     foreign_keys = "Accounts",
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        Database.Starts.invalidate()   # the start totals may have changed
+
     @property
     def section(self):
         return Database.Accounts[self.account].section
@@ -227,6 +266,9 @@ class Reconcile(Starts):
     )
     primary_keys = None
 
+    # Reconcile rows aren't in the Starts table
+    __setattr__ = Row.__setattr__
+
     @property
     def total(self):
         r'''Includes Start amount.
@@ -244,10 +286,7 @@ class Reconcile(Starts):
         price = self.ticket_price
         if price is None:
             return None
-        total = self.total
-        start_key = self.account, "start"
-        if start_key in Database.Starts:
-            total -= Database.Starts[start_key].total
+        total = self.total - Database.Starts.start_total(self.account)
         return int(math.ceil(total / price))
 
 
@@ -256,7 +295,8 @@ Rows = (Months, Globals, Accounts, Starts, Reconcile,
        )
 
 
-__all__ = "Decimal date datetime timedelta abbr_month bills Rows".split()
+__all__ = "Decimal date datetime timedelta abbr_month bills Rows Database_filename " \
+          "Off_season Month_calendar month_calendar".split()
 
 
 def run():
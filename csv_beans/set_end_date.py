@@ -5,8 +5,7 @@ r'''Sets end_date in current Month.
 
 import sys
 
-sys.path.append('.')
-from database import *
+from .database import *
 
 
 def run():
@@ -52,7 +51,12 @@ def run():
 
     if not ans or ans[0].lower() == 'y':
         print("Saving Database")
-        save_database()
+        try:
+            save_database()
+        except Conflict_error as e:
+            print(e, file=sys.stderr)
+            print("Database not saved", file=sys.stderr)
+            sys.exit(1)
     else:
         print("Trial_run: Database not saved")
 
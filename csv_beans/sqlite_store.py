@@ -0,0 +1,196 @@
+# sqlite_store.py
+
+r'''SQLite storage for the beans database.
+
+This is used in place of beans.csv when the database filename ends in ".sqlite" or ".db".  The
+rows are loaded into the same Tables, so the commands don't know the difference.
+
+Each table has an "id" column that keeps the rows in their insertion order, and one column per
+stored (not calculated) column.  Dates are stored as ISO "YYYY-MM-DD" text so they sort, and
+Decimals as text so they round-trip exactly.
+
+Reconcile is indexed on (date) and (account, detail), and can be loaded starting at a date or at
+the date of its last "cash", "w/starts" checkpoint.  Saves are done in a single transaction, and only write
+the Reconcile rows that were added or changed since the load.
+'''
+
+from datetime import date
+from decimal import Decimal
+import sqlite3
+
+from csv_app.row import Date_column
+from csv_app.table import set_database_filename
+
+from .tables import *
+from .rows import Rows
+from .beans_csv import stored_columns
+
+
+Indexes = (
+    ("Reconcile_date", "Reconcile", ("date",)),
+    ("Reconcile_account_detail", "Reconcile", ("account", "detail")),
+)
+
+
+def column_type(col):
+    if isinstance(col, Date_column):
+        return "TEXT"
+    if col.parse is int:
+        return "INTEGER"
+    return "TEXT"
+
+
+def to_sql(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def from_sql_fn(col):
+    r'''Returns the function to convert a non-NULL sqlite value back for col.
+    '''
+    if isinstance(col, Date_column):
+        return date.fromisoformat
+    if col.parse is Decimal:
+        return Decimal
+    return None
+
+
+class Sqlite_database:
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.columns = {row_class.__name__: stored_columns(row_class) for row_class in Rows}
+        self.reconcile_ids = []     # sqlite ids of the Reconcile rows loaded
+        self.reconcile_values = []  # stored values of the Reconcile rows loaded, as tuples
+        self.create_schema()
+
+    def close(self):
+        self.connection.close()
+
+    def create_schema(self):
+        with self.connection:
+            for table_name, columns in self.columns.items():
+                column_defs = ", ".join(f'"{col.name}" {column_type(col)}' for col in columns)
+                self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" '
+                                        f'(id INTEGER PRIMARY KEY, {column_defs})')
+            for index_name, table_name, column_names in Indexes:
+                names = ", ".join(f'"{name}"' for name in column_names)
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" '
+                                        f'ON "{table_name}" ({names})')
+
+    def values(self, table_name, row):
+        return tuple(to_sql(getattr(row, col.name)) for col in self.columns[table_name])
+
+    def insert_sql(self, table_name):
+        columns = self.columns[table_name]
+        names = ", ".join(f'"{col.name}"' for col in columns)
+        params = ", ".join("?" * len(columns))
+        return f'INSERT INTO "{table_name}" ({names}) VALUES ({params})'
+
+    def select(self, table_name, where='', params=()):
+        r'''Generates {column_name: value} dicts, and sets self.last_id to each row's id.
+        '''
+        columns = self.columns[table_name]
+        conversions = [(col.name, from_sql_fn(col)) for col in columns]
+        names = ", ".join(f'"{col.name}"' for col in columns)
+        cursor = self.connection.execute(f'SELECT id, {names} FROM "{table_name}" {where} ORDER BY id',
+                                         params)
+        for id, *values in cursor:
+            self.last_id = id
+            yield {name: value if conv is None or value is None else conv(value)
+                   for (name, conv), value in zip(conversions, values)}
+
+    def checkpoint_id(self):
+        r'''The id of the last "cash", "w/starts" Reconcile row, or None.
+        '''
+        return self.connection.execute(
+                 'SELECT max(id) FROM "Reconcile" WHERE account = ? AND detail = ?',
+                 ("cash", "w/starts")).fetchone()[0]
+
+    def load(self, since=None):
+        r'''Loads the Tables from the database.
+
+        since limits which Reconcile rows are loaded.  It may be None (all rows), a date (rows on or
+        after that date) or "checkpoint" (rows on or after the date of the last "cash", "w/starts"
+        row).
+        '''
+        clear_all()
+        for table_name in self.columns:
+            if table_name == "Reconcile":
+                continue
+            table = Tables[table_name]
+            for attrs in self.select(table_name):
+                table.insert(**attrs)
+        where, params = '', ()
+        if since == "checkpoint":
+            if (id := self.checkpoint_id()) is not None:
+                where, params = 'WHERE date >= (SELECT date FROM "Reconcile" WHERE id = ?)', (id,)
+        elif since is not None:
+            where, params = 'WHERE date >= ?', (since.isoformat(),)
+        reconcile = Tables["Reconcile"]
+        self.reconcile_ids = []
+        for attrs in self.select("Reconcile", where, params):
+            reconcile.insert(**attrs)
+            self.reconcile_ids.append(self.last_id)
+        self.reconcile_values = [self.values("Reconcile", row) for row in reconcile]
+
+    def save(self, replace=False):
+        r'''Saves the Tables to the database in one transaction.
+
+        The other tables are small, so they are simply replaced.  Only the Reconcile rows that
+        were added, or changed, since the load are written, unless `replace` is set.  Then all
+        of the Reconcile rows in the database are replaced (used to import).
+        '''
+        reconcile = Tables["Reconcile"]
+        columns = self.columns["Reconcile"]
+        update_sql = 'UPDATE "Reconcile" SET ' + ", ".join(f'"{col.name}" = ?' for col in columns) \
+                   + ' WHERE id = ?'
+        with self.connection:
+            if replace:
+                self.connection.execute('DELETE FROM "Reconcile"')
+                self.reconcile_ids = []
+                self.reconcile_values = []
+            for table_name in self.columns:
+                if table_name != "Reconcile":
+                    self.connection.execute(f'DELETE FROM "{table_name}"')
+                    self.connection.executemany(self.insert_sql(table_name),
+                                                (self.values(table_name, row)
+                                                 for row in Tables[table_name].values()))
+            num_loaded = len(self.reconcile_ids)
+            for id, old_values, row in zip(self.reconcile_ids, self.reconcile_values, reconcile):
+                values = self.values("Reconcile", row)
+                if values != old_values:
+                    self.connection.execute(update_sql, values + (id,))
+            for row in reconcile[num_loaded:]:
+                cursor = self.connection.execute(self.insert_sql("Reconcile"),
+                                                 self.values("Reconcile", row))
+                self.reconcile_ids.append(cursor.lastrowid)
+        self.reconcile_values = [self.values("Reconcile", row) for row in reconcile]
+
+
+def run():
+    r'''Imports beans.csv into an sqlite database, or exports it back.
+    '''
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("direction", choices=("import", "export"))
+    parser.add_argument("--csv", "-c", default="beans.csv")
+    parser.add_argument("--sqlite", "-s", default="beans.sqlite")
+
+    args = parser.parse_args()
+
+    store = Sqlite_database(args.sqlite)
+    set_database_filename(args.csv)
+    if args.direction == "import":
+        load_csv_database(args.csv)
+        store.save(replace=True)
+        print(f"Imported {args.csv} into {args.sqlite}")
+    else:
+        store.load()
+        save_csv_database()
+        print(f"Exported {args.sqlite} to {args.csv}")
+    store.close()
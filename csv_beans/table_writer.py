@@ -0,0 +1,124 @@
+# table_writer.py
+
+r'''Writes batches of rows as text, csv or json lines.
+
+The formatting is compiled once per writer, and each batch of rows is written with a single
+file.write.
+'''
+
+import csv
+from datetime import date
+from decimal import Decimal
+import io
+import json
+from operator import attrgetter
+import sys
+
+from .rows import bills
+
+
+Formats = ("text", "csv", "json")
+
+
+class Out_column:
+    r'''name is the row attribute.  text_header and spec are for text output.
+
+    The text_header should be padded to the width of the formatted values.
+    '''
+    def __init__(self, name, text_header=None, spec=''):
+        self.name = name
+        self.text_header = text_header if text_header is not None else name
+        self.spec = spec
+        self.width = len(self.text_header)
+
+
+Bills_columns = tuple(Out_column(name, header, spec) for name, header, spec in bills.text_columns)
+
+
+def to_json(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{value!r} is not JSON serializable")
+
+
+class Table_writer:
+    r'''Writes rows to `file` in one of the `Formats`.
+
+    If label is given, it's (name, text_header), and each row is written with a label in front
+    of it.  In text the label is padded to the width of its text_header.
+    '''
+    def __init__(self, columns, format="text", file=sys.stdout, label=None):
+        assert format in Formats, f"unknown format {format!r}, expected one of {Formats}"
+        self.columns = tuple(columns)
+        self.format = format
+        self.file = file
+        self.label = label
+        names = [col.name for col in self.columns]
+        self.names = names if label is None else [label[0]] + names
+        self.getter = attrgetter(*names)
+        if len(names) == 1:
+            getter = self.getter
+            self.getter = lambda row: (getter(row),)
+        self.text_format = "|".join(f"{{{i}:{col.spec}}}" for i, col in enumerate(self.columns))
+        self.blanks = tuple(' ' * col.width for col in self.columns)
+        self.encode = {"text": self.text_lines, "csv": self.csv_lines, "json": self.json_lines}[format]
+
+    def text_line(self, values):
+        if None in values:
+            return "|".join(self.blanks[i] if value is None else format(value, col.spec)
+                            for i, (col, value) in enumerate(zip(self.columns, values)))
+        return self.text_format.format(*values)
+
+    def text_lines(self, rows, labels):
+        text_line = self.text_line
+        if self.label is None:
+            return ''.join([text_line(self.getter(row)) + '\n' for row in rows])
+        width = len(self.label[1])
+        return ''.join([f"{label:{width}}|{text_line(self.getter(row))}\n"
+                        for row, label in zip(rows, labels)])
+
+    def values(self, rows, labels):
+        if self.label is None:
+            return [self.getter(row) for row in rows]
+        return [(label,) + self.getter(row) for row, label in zip(rows, labels)]
+
+    def csv_lines(self, rows, labels):
+        out = io.StringIO()
+        csv.writer(out, lineterminator='\n').writerows(self.values(rows, labels))
+        return out.getvalue()
+
+    def json_lines(self, rows, labels):
+        names = self.names
+        return ''.join([json.dumps(dict(zip(names, values)), default=to_json) + '\n'
+                        for values in self.values(rows, labels)])
+
+    def header(self):
+        if self.format == "json":
+            return ''
+        if self.format == "csv":
+            out = io.StringIO()
+            csv.writer(out, lineterminator='\n').writerow(self.names)
+            return out.getvalue()
+        line = "|".join(col.text_header for col in self.columns)
+        if self.label is None:
+            return line + '\n'
+        return f"{self.label[1]}|{line}\n"
+
+    def write_header(self):
+        self.file.write(self.header())
+
+    def write_rows(self, rows, labels=None):
+        r'''Writes all of the rows with one write.
+
+        If the writer has a label, labels is a sequence of labels, one per row.
+        '''
+        self.file.write(self.encode(rows, labels))
+
+    def write_row(self, row, label=None):
+        self.write_rows((row,), (label,))
+
+
+def bills_writer(format="text", file=sys.stdout, label=None):
+    return Table_writer(Bills_columns, format, file, label)
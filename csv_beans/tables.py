@@ -1,15 +1,323 @@
 # tables.py
 
+from bisect import bisect_right
+import shutil
 from statistics import mean
 
 from csv_app.table import *
-from .rows import bills, Rows
+from .rows import bills, Rows, Database_filename, Sqlite_suffixes, Off_season, Month_calendar, \
+                  month_calendar
+from .beans_csv import tables, table_rows, lazy_row_class, parse_date, Row_error, append_rows, \
+                       last_table
+from .locking import Conflict_error, lock, version, same_version, atomic_save
+
+
+save_csv_database = save_database
+
+sqlite_database = None   # the sqlite_store.Sqlite_database, once opened
+
+
+def using_sqlite():
+    r'''Returns the sqlite_store.Sqlite_database if Database_filename is an sqlite database, else
+    None.
+    '''
+    global sqlite_database
+    if not Database_filename.endswith(Sqlite_suffixes):
+        return None
+    if sqlite_database is None:
+        from .sqlite_store import Sqlite_database
+
+        sqlite_database = Sqlite_database(Database_filename)
+    return sqlite_database
+
+# What's in the csv file as of the last load or save, to tell if anyone else has saved since.
+Small_tables = tuple(row_class.__name__ for row_class in Rows if row_class.__name__ != "Reconcile")
+loaded_version = None       # locking.version of the file
+loaded_num_reconcile = 0    # number of Reconcile rows in the file
+loaded_values = None        # {table_name: [stored_values]} for the Small_tables
+
+def stored_values(row):
+    return tuple(getattr(row, col.name) for col in row.columns if not col.calculated)
+
+def small_table_values():
+    return {name: [stored_values(row) for row in Tables[name].values()] for name in Small_tables}
+
+def record_loaded():
+    global loaded_version, loaded_num_reconcile, loaded_values
+    loaded_version = version(Database_filename)
+    loaded_num_reconcile = len(Tables["Reconcile"])
+    loaded_values = small_table_values()
+
+def load_csv_database(filename=Database_filename, since=None):
+    r'''Loads the Tables from the csv file, filename.
+
+    The cells are converted by beans_csv's compiled row converters and the rows inserted, as
+    sqlite_store does.  A cell that can't be converted raises beans_csv.Row_error.
+
+    since is as for load_database.  All of Reconcile is loaded, but the rows before since are
+    lazy (see beans_csv.Lazy_row): their cells are only decoded if they're looked at.
+    '''
+    clear_all()
+    for name, table, headers, rows in csv_tables(filename):
+        if name == "Reconcile" and since is not None:
+            rows = list(rows)
+            split = lazy_split(headers, rows, since)
+            lazy_class = lazy_row_class(table.row_class, headers, table.row_class)
+            for _, cells in rows[:split]:
+                table.insert_row(lazy_class(cells))
+            rows = rows[split:]
+        for _, attrs in table_rows(table.row_class, headers, rows):
+            table.insert(**attrs)
+
+def read_csv_database(filename=Database_filename):
+    r'''Reads the csv file, filename, without touching the Tables.
+
+    Returns {table_name: [attrs]}, with a {column_name: value} dict for each row, as
+    load_csv_database would insert them.
+    '''
+    return {name: [attrs for _, attrs in table_rows(table.row_class, headers, rows)]
+            for name, table, headers, rows in csv_tables(filename)}
+
+def csv_tables(filename):
+    r'''Generates (name, table, headers, rows) for each table in the csv file, filename.
+
+    rows are the (line_number, cells) for the table (see beans_csv.tables).  An unknown table
+    raises beans_csv.Row_error.
+    '''
+    with open(filename, newline='') as file:
+        for name, headers, rows in tables(file):
+            if name not in Tables:
+                raise Row_error(headers.line_number - 1, f"unknown table {name!r}")
+            yield name, Tables[name], headers, rows
+
+def lazy_split(headers, rows, since):
+    r'''Returns the index of the first of the (line_number, cells) rows on or after since.
+
+    since is a date, or "checkpoint" for the date of the last "cash", "w/starts" row.  Only the
+    rows from there on are looked at.
+    '''
+    date_i, account_i, detail_i = (headers.index(name) for name in ("date", "account", "detail"))
+    if since == "checkpoint":
+        for _, cells in reversed(rows):
+            if cells[account_i].strip() == "cash" and cells[detail_i].strip() == "w/starts":
+                since = parse_date(cells[date_i].strip())
+                break
+        else:
+            return 0
+    split = len(rows)
+    while split and parse_date(rows[split - 1][1][date_i].strip()) >= since:
+        split -= 1
+    return split
+
+def load_database(since=None):
+    r'''Loads the Tables from Database_filename.
+
+    since is for commands that only need the recent Reconcile rows.  It may be None (all rows), a
+    date, or "checkpoint" (from the date of the last "cash", "w/starts" row on).  An sqlite
+    database only loads the Reconcile rows from since on (see sqlite_store.Sqlite_database.load).
+    A csv file is loaded in full, under a shared lock, but the Reconcile rows before since are
+    lazy.
+    '''
+    if (store := using_sqlite()) is not None:
+        store.load(since)
+    else:
+        with lock(Database_filename):
+            load_csv_database(Database_filename, since)
+            record_loaded()
+
+def save_csv_to(filename):
+    set_database_filename(filename)
+    try:
+        save_csv_database()
+    finally:
+        set_database_filename(Database_filename)
+
+def reload_and_append(merge):
+    r'''Someone else has saved the csv file since it was loaded.
+
+    If merge is set, and the only changes here are Reconcile rows added to the end, reloads the
+    file and adds those rows to the end again.  Otherwise raises Conflict_error.
+
+    The rows added here are checked against the file's Reconcile rows, as the importer does:
+    exact duplicates (e.g., the same file imported by someone else) are dropped, and a near
+    duplicate, or a row dated before the file's last row (e.g., someone else has added a "cash",
+    "w/starts" row since), raises Conflict_error.  The checks are done on a fresh read of the
+    file, so on Conflict_error the Tables are left as they were.  Nothing is added unless all of
+    the rows pass.
+    '''
+    from types import SimpleNamespace
+    from .importer import Duplicate_index
+
+    if not merge:
+        raise Conflict_error(f"{Database_filename} has been changed since it was loaded")
+    changed = [name for name, values in small_table_values().items()
+               if values != loaded_values[name]]
+    if changed:
+        raise Conflict_error(f"{Database_filename} has been changed since it was loaded, "
+                             f"can't merge the changes to {', '.join(changed)}")
+    reconcile = Tables["Reconcile"]
+    columns = [col for col in reconcile.row_class.columns if not col.calculated]
+    added = [{col.name: getattr(row, col.name) for col in columns}
+             for row in reconcile[loaded_num_reconcile:]]
+    fresh = read_csv_database(Database_filename)
+    defaults = {col.name: col.default for col in columns}
+    theirs = [SimpleNamespace(**(defaults | attrs)) for attrs in fresh.get("Reconcile", ())]
+    duplicates = Duplicate_index(theirs)
+    last_date = theirs[-1].date if theirs else None
+    merged = []
+    for attrs in added:
+        row = SimpleNamespace(**attrs)
+        duplicate = duplicates.check(row)
+        if duplicate == "exact":
+            continue
+        if duplicate == "near":
+            raise Conflict_error(f"{Database_filename} has been changed since it was loaded, "
+                                 f"and now has a near duplicate of {row.date:%b %d, %y} "
+                                 f"{row.account}({row.detail})")
+        if last_date is not None and row.date < last_date:
+            raise Conflict_error(f"{Database_filename} has been changed since it was loaded, "
+                                 f"{row.date:%b %d, %y} {row.account}({row.detail}) would be "
+                                 f"after its {last_date:%b %d, %y} rows")
+        duplicates.add(row)
+        last_date = row.date
+        merged.append(attrs)
+    clear_all()
+    for name, rows in fresh.items():
+        table = Tables[name]
+        for attrs in rows:
+            table.insert(**attrs)
+    for attrs in merged:
+        reconcile.insert(**attrs)
+
+def save_database(merge=False):
+    r'''Saves the Tables to Database_filename.
+
+    A csv file is saved under an exclusive lock, by writing a temp file and renaming it.  If
+    someone else has saved it since it was loaded, the rows added to Reconcile here are merged
+    into their version with merge, otherwise Conflict_error is raised (see reload_and_append).
+
+    Returns True if the Tables were reloaded to merge, so anything built from them needs to be
+    rebuilt.
+
+    sqlite does its own locking, and its saves only insert the Reconcile rows added here, so merge
+    doesn't apply.
+    '''
+    if (store := using_sqlite()) is not None:
+        store.save()
+        return False
+    with lock(Database_filename, exclusive=True):
+        merged = not same_version(Database_filename, loaded_version)
+        if merged:
+            reload_and_append(merge)
+        atomic_save(Database_filename, save_csv_to)
+        record_loaded()
+    return merged
+
+def save_appended(start_index, merge=False):
+    r'''Saves the Tables, when the only change is the Reconcile rows added from start_index on.
+
+    Appends them to the end of the csv file if possible (see append_reconcile), so that the rows
+    already in the file aren't decoded and written again.  Otherwise saves the whole database
+    (see save_database).
+
+    Returns True if the Tables were reloaded to merge, as save_database does.
+    '''
+    if append_reconcile(start_index):
+        return False
+    return save_database(merge)
+
+def append_reconcile(start_index):
+    r'''Saves the Reconcile rows from start_index on by adding them to the end of the csv file,
+    rather than saving all of the Tables.
+
+    Returns False, without saving anything, if the database is sqlite, Reconcile isn't the last
+    table in the file, or someone else has saved it since it was loaded.
+    '''
+    global loaded_version, loaded_num_reconcile
+    if using_sqlite() is not None:
+        return False
+    reconcile = Tables["Reconcile"]
+
+    def append(temp):
+        shutil.copyfile(Database_filename, temp)
+        append_rows(temp, "Reconcile", reconcile.row_class, reconcile[start_index:])
+
+    with lock(Database_filename, exclusive=True):
+        if not same_version(Database_filename, loaded_version) \
+           or last_table(Database_filename)[0] != "Reconcile":
+            return False
+        atomic_save(Database_filename, append)
+        loaded_version = version(Database_filename)
+        loaded_num_reconcile = len(reconcile)
+    return True
 
 
 class No_results(Exception):
     pass
 
 class Months(Table_unique):
+    r'''The calendar (see calendar) and the date -> month resolution (see month_of) are cached.
+
+    Insert, and any change to a Months row (see rows.Months.__setattr__), drop the caches.
+    '''
+    calendar_cache = None   # (horizon, {(year, month): Month_calendar})
+    resolver = None         # (start_dates, [(start_date, end_date, (year, month))]) for month_of
+
+    def insert(self, **attrs):
+        ans = super().insert(**attrs)
+        self.invalidate()
+        return ans
+
+    def invalidate(self):
+        self.calendar_cache = None
+        self.resolver = None
+
+    def calendar(self, horizon=12):
+        r'''Returns {(year, month): Month_calendar} for every month in the table, and every month
+        for `horizon` months past the last one (or past today, if the table is empty).
+        '''
+        if self.calendar_cache is None or self.calendar_cache[0] != horizon:
+            keys = sorted((row.year, row.month) for row in self.values())
+            calendar = {key: month_calendar(*key) for key in keys}
+            year, month = keys[-1] if keys else (date.today().year, date.today().month)
+            for _ in range(horizon):
+                year, month = self.inc_month(year, month)
+                calendar[year, month] = month_calendar(year, month)
+            self.calendar_cache = horizon, calendar
+        return self.calendar_cache[1]
+
+    def month_of(self, d):
+        r'''Returns the (year, month) that date d belongs to.
+
+        This is the month whose start_date and end_date cover d.  If there isn't one, it's d's
+        calendar month.
+        '''
+        if self.resolver is None:
+            dated = sorted((row.start_date, row.end_date, (row.year, row.month))
+                           for row in self.values() if row.start_date is not None)
+            self.resolver = [start for start, _, _ in dated], dated
+        start_dates, dated = self.resolver
+        i = bisect_right(start_dates, d) - 1
+        if i >= 0:
+            _, end_date, key = dated[i]
+            if end_date is None or d <= end_date:
+                return key
+        return d.year, d.month
+
+    def months_of(self, dates):
+        r'''Returns a list of the (year, month) for each of the dates.
+
+        Each distinct date is only resolved once.
+        '''
+        found = {}
+        ans = []
+        for d in dates:
+            key = found.get(d)
+            if key is None:
+                key = found[d] = self.month_of(d)
+            ans.append(key)
+        return ans
+
     @staticmethod
     def inc_month(year, month):
         r'''Returns next month (regardless of the contents of this Table) as (year, month).
@@ -90,10 +398,66 @@ class Months(Table_unique):
         '''
         return self.avg(month, 'meals_served')
 
-load_rows(Rows, Months)
+class Reconcile(Table):
+    r'''Can also hold lazy rows (see load_csv_database).
+    '''
+    def insert_row(self, row):
+        r'''Adds row, which is already built, to the end of the table.
+
+        Unlike insert, nothing is converted, so a lazy row stays lazy.
+        '''
+        self.rows.append(row)
+        return row
+
+class Starts(Table_unique):
+    r'''Keeps the totals of the "start" rows, so that they aren't summed over and over.
+
+    They are figured when first needed, and dropped by insert, and by any change to a Starts row
+    (see rows.Starts.__setattr__).
+    '''
+    aggregates = None   # (bills of all of the starts, {account: "start" row})
+
+    def insert(self, **attrs):
+        ans = super().insert(**attrs)
+        self.invalidate()
+        return ans
+
+    def invalidate(self):
+        self.aggregates = None
+
+    def get_aggregates(self):
+        if self.aggregates is None:
+            total = bills()
+            starts = {}
+            for row in self.values():
+                if row.detail == "start":
+                    total += row
+                    starts[row.account] = row
+            self.aggregates = total, starts
+        return self.aggregates
+
+    def start_bills(self):
+        r'''Returns the sum of all of the "start" rows as a new bills object.
+        '''
+        return self.get_aggregates()[0].copy()
+
+    def start(self, account):
+        r'''Returns the "start" row for account, or None.
+        '''
+        return self.get_aggregates()[1].get(account)
+
+    def start_total(self, account):
+        r'''Returns the total of the "start" row for account, or 0 if it doesn't have one.
+        '''
+        start = self.get_aggregates()[1].get(account)
+        return 0 if start is None else start.total
+
+load_rows(Rows, Months, Starts, Reconcile)
 
 
-__all__ = "Decimal date datetime timedelta abbr_month bills Tables Database " \
-          "load_database save_database load_csv load_all clear_all check_foreign_keys " \
-          "CSV_dialect CSV_format".split()
+__all__ = "Decimal date datetime timedelta abbr_month bills Tables Database Database_filename " \
+          "load_database save_database load_csv_database save_csv_database using_sqlite " \
+          "save_appended append_reconcile Conflict_error stored_values " \
+          "load_csv load_all clear_all check_foreign_keys " \
+          "CSV_dialect CSV_format Off_season Month_calendar month_calendar".split()
 
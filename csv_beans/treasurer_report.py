@@ -2,11 +2,56 @@
 
 from datetime import date, timedelta
 from collections import defaultdict
+from contextlib import redirect_stdout
+from io import StringIO
 from itertools import groupby
 from operator import attrgetter
 
 from .database import *
-from csv_app.report import *
+from .report_cache import Report_cache, fingerprint
+
+
+Pdf_filename = "T-Report.pdf"
+
+
+def find_final(end_date):
+    r'''Find the final balance in the Reconcile table for end_date.
+
+    Returns index, recon row.
+    '''
+    index = Reconcile.last_date(end_date)   # index just past end_date
+   #print(f"{end_date=}, {start_index=}")
+    error_msg = f"{end_date.strftime('%b %d, %y')}, month end final balance not found in Reconcile"
+    recon = Reconcile[index - 1]
+    if recon.account == 'cash' and recon.detail == 'w/starts':
+       #print("found final balance")
+        return index - 1, recon
+    raise AssertionError(error_msg)
+
+
+def window_totals(prev_index, final_index):
+    r'''Totals Reconcile from prev_index up to (but not including) final_index.
+
+    Returns {(account, detail): total} for the "revenue" and "expense" accounts,
+    {account: amount} for the other Cash Flow accounts (and "donations" and "bf donations"), and
+    {account: tickets_sold} for the " tickets" accounts.  Each is in the order first seen.
+    '''
+    details = defaultdict(int)
+    amounts = defaultdict(int)
+    tickets = defaultdict(int)
+    for recon in Reconcile[prev_index:final_index]:
+        if recon.account.startswith("revenue") or recon.account.startswith("expense"):
+            details[recon.account, recon.detail] += recon.total
+            amounts["donations"] += recon.donations
+        elif recon.section == "Cash Flow":
+            if recon.account.endswith(" tickets"):
+                tickets[recon.account] += recon.tickets_sold
+            amounts[recon.account] += recon.total - Starts.start_total(recon.account)
+            if recon.category == "Breakfast":
+                amounts["bf donations"] += recon.donations
+            else:
+                amounts["donations"] += recon.donations
+    return details, amounts, tickets
 
 
 def run():
@@ -19,6 +64,10 @@ def run():
     parser.add_argument("--month", "-m", type=int, default=today.month)
     parser.add_argument("--year", "-y", type=int, default=today.year)
     parser.add_argument("--pdf", "-p", action="store_true", default=False)
+    parser.add_argument("--no-cache", "-n", action="store_true", default=False,
+                        help="don't use (or update) the cache of closed month reports")
+    parser.add_argument("--compare", "-c", type=int, default=0, metavar="N",
+                        help="compare the month with the same month in the previous N years")
 
     args = parser.parse_args()
 
@@ -32,6 +81,12 @@ def run():
         year -= 1
     day = args.day
 
+    if args.compare:
+        from .comparative_report import comparative_report
+
+        comparative_report(year, month, args.compare)
+        return
+
     print()
     print("Current month", abbr_month(month), year)
     cur_month = Months[year, month]
@@ -39,20 +94,6 @@ def run():
     if end_date is None and day is not None:
         end_date = date(year, month, day)
 
-    def find_final(end_date):
-        r'''Find the final balance in the Reconcile table for end_date.
-
-        Returns index, recon row.
-        '''
-        index = Reconcile.last_date(end_date)   # index just past end_date
-       #print(f"{end_date=}, {start_index=}")
-        error_msg = f"{end_date.strftime('%b %d, %y')}, month end final balance not found in Reconcile"
-        recon = Reconcile[index - 1]
-        if recon.account == 'cash' and recon.detail == 'w/starts':
-           #print("found final balance")
-            return index - 1, recon
-        raise AssertionError(error_msg)
-
     if end_date is not None:
         final_index, final_balance = find_final(end_date)
     else:
@@ -68,7 +109,26 @@ def run():
     print(as_of)
     print()
 
+    prev_end_date  = cur_month.start_date - timedelta(days=1)
+    prev_index, prev_balance = find_final(prev_end_date)
+
+    # Closed months (with an end_date) can be cached.
+    cache = None
+    if cur_month.end_date is not None and not args.no_cache:
+        cache = Report_cache()
+        key = fingerprint(cur_month, Reconcile[prev_index:final_index + 1])
+        if args.pdf:
+            if cache.get_pdf(year, month, key, Pdf_filename):
+                print(f"{Pdf_filename} copied from the report cache")
+                return
+        elif (text := cache.get_text(year, month, key)) is not None:
+            print(text, end='')
+            return
+
     # print Treasurer's Report
+    from csv_app.report import set_canvas, get_pagesize, canvas_showPage, canvas_save, \
+                               Report, Row_template, Centered, Left, Right
+
     set_canvas("T-Report")
     report = Report(title=(Centered(span=5, size="title", bold=True),),
                     l0=(Left(bold=True, span=4),           Right(text_format="{:.2f}")),
@@ -80,9 +140,6 @@ def run():
     report.new_row("title", "Treasurer's Report")
     report.new_row("title", as_of, size=report.default_size)
 
-    prev_end_date  = cur_month.start_date - timedelta(days=1)
-    prev_index, prev_balance = find_final(prev_end_date)
-
     prev_month_str = f"{abbr_month(prev_end_date.month)} '{str(prev_end_date.year)[2:]}"
 
     # Create Row_templates from Accounts:
@@ -159,27 +216,15 @@ def run():
     other_revenue = defaultdict(int)   # {account: total}
     other_expenses = defaultdict(int)  # {account: total}
 
-    details = {}  # {account, detail: Row_template}
-    for i in range(prev_index, final_index):  # loop from prev_index up to (but not including) final_index
-        recon = Reconcile[i]
-        if recon.account.startswith("revenue") or recon.account.startswith("expense"):
-            key = recon.account, recon.detail
-            if key not in details:
-                templ = Row_template("l3", recon.detail)
-                details[key] = templ
-                picks[recon.account].add_child(templ)
-            details[key] += recon.total
-            accounts["donations"] += recon.donations
-        elif recon.section == "Cash Flow":
-            if recon.account.endswith(" tickets"):
-                accounts[recon.account].inc_text2_value(recon.tickets_sold)
-            accounts[recon.account] += recon.total
-            if (recon.account, "start") in Starts:
-                accounts[recon.account] -= Starts[recon.account, "start"].total
-            if recon.category == "Breakfast":
-                accounts["bf donations"] += recon.donations
-            else:
-                accounts["donations"] += recon.donations
+    details, amounts, tickets = window_totals(prev_index, final_index)
+    for (account, detail), total in details.items():
+        templ = Row_template("l3", detail)
+        picks[account].add_child(templ)
+        templ += total
+    for account, n in tickets.items():
+        accounts[account].inc_text2_value(n)
+    for account, amount in amounts.items():
+        accounts[account] += amount
 
     picks["cash flow"].insert(report)
     picks["balance"].insert(report)
@@ -197,7 +242,14 @@ def run():
                 report.draw(x_offset, y_offset)
         canvas_showPage()
         canvas_save()
+        if cache is not None:
+            cache.put_pdf(year, month, key, Pdf_filename)
     else:
         report.print_init()
-        report.print()
+        out = StringIO()
+        with redirect_stdout(out):
+            report.print()
+        print(out.getvalue(), end='')
+        if cache is not None:
+            cache.put_text(year, month, key, out.getvalue())
 
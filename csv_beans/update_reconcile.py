@@ -1,17 +1,40 @@
 # update_reconcile.py
 
 r'''
-  - read Reconcile.csv into Reconcile table
-  - clears Reconcile.csv
+  - read Reconcile csv files into Reconcile table
+  - clears the Reconcile csv files
 '''
 
 from datetime import date, timedelta
 from collections import defaultdict
+from glob import glob
 import math
+import os
 import sys
 
 from .database import *
-from csv_app.report import *
+from .importer import Importer
+from .table_writer import bills_writer
+from .validate import Validation_error
+
+
+def expand_files(names):
+    r'''Expands glob patterns in names.  Names without a match are passed through unchanged.
+    '''
+    filenames = []
+    for name in names:
+        filenames.extend(sorted(glob(name)) or [name])
+    return filenames
+
+
+def clear_file(recon_file):
+    print("Clearing", recon_file)
+    with open(recon_file, "r") as file_in:
+        table_name = file_in.readline()
+        headers = file_in.readline()
+    with open(recon_file, "w") as file_out:
+        print(table_name, end='', file=file_out)
+        print(headers, end='', file=file_out)
 
 
 def run():
@@ -20,76 +43,72 @@ def run():
     parser = argparse.ArgumentParser()
     parser.add_argument("--trial-run", "-t", action="store_true", default=False)
     parser.add_argument("--no-clear", "-n", action="store_true", default=False)
-    parser.add_argument("reconcile_csv_file", nargs='?', default=None)
+    parser.add_argument("--batch-size", "-b", type=int, default=1000)
+    parser.add_argument("--allow-near-duplicates", "-a", action="store_true", default=False)
+    parser.add_argument("--watch", "-w", metavar="DROP_DIR", default=None,
+                        help="ingest csv files as they land in DROP_DIR")
+    parser.add_argument("--archive", metavar="ARCHIVE_DIR", default=None,
+                        help="where --watch moves processed files (default DROP_DIR/archive)")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="seconds a --watch file must be unchanged before it's ingested")
+    parser.add_argument("reconcile_csv_files", nargs='*', default=["Reconcile.csv"],
+                        help="files or glob patterns")
 
     args = parser.parse_args()
 
-    load_database()
+    load_database(since="checkpoint")
+
+    if args.watch is not None:
+        from .watch import watch
+
+        watch(args.watch, args.archive or os.path.join(args.watch, "archive"),
+              debounce=args.debounce, trial_run=args.trial_run,
+              allow_near_duplicates=args.allow_near_duplicates)
+        return
+
     last_row = Reconcile[-1]
     if last_row.account == "cash" and last_row.detail == "w/starts":
         starting_balance = last_row
         ending_balance = starting_balance.copy()
     else:
-        starting_balance = None
+        starting_balance = ending_balance = None
     last_date = last_row.date
     starting_num_rows = len(Reconcile)
-    recon_file = args.reconcile_csv_file or "Reconcile.csv"
-    print("Copying", recon_file, "into database")
-    rows_added = load_csv(recon_file, from_scratch=False)
+    recon_files = expand_files(args.reconcile_csv_files)
+    importer = Importer(args.batch_size, args.allow_near_duplicates, ending_balance)
+    try:
+        summaries = importer.import_files(recon_files)
+    except Validation_error as e:
+        print(e, file=sys.stderr)
+        print("Database not saved", file=sys.stderr)
+        sys.exit(1)
     index = Reconcile.find_date(last_date, find_first=False)
     assert index == starting_num_rows, \
       f"Reconcile started with {starting_num_rows} rows up to {last_date}, now has {index} rows up to that date"
-    date_column = Reconcile.row_class.column_map['date']
-    total = 0
-    for row in Reconcile[index:]:
-        print(f"{date_column.to_csv(row.date)}: {row.account}({row.detail}) = {row.total}", end='')
-        if row.donations:
-            print(f", donations={row.donations}")
-        else:
-            print()
-        if row.type == "Revenue":
-            total += row.total
-            if starting_balance is not None:
-                ending_balance += row
-                if (row.account, "start") in Starts:
-                    starts_row = Starts[row.account, "start"]
-                    ending_balance -= starts_row
-                    print(f"            - starts({starts_row.total}) = {row.total - starts_row.total}")
-                    total -= starts_row.total
-        elif row.type == "Expenses":
-            total -= row.total
-            if starting_balance is not None:
-                ending_balance -= row
-    print("total", total)
+    print("total", sum(summary.total for summary in summaries))
+    if importer.skipped:
+        print("duplicates skipped", importer.skipped)
     if starting_balance is not None:
         print("starting balance:", starting_balance.total)
-        print("ending balance|coin|b1|b5|b10|b20|b50|b100|total")
-        print("              ", end='')
-        print(f"|{ending_balance.coin:4.3}", end='')
-        print(f"|{ending_balance.b1:2}", end='')
-        print(f"|{ending_balance.b5:2}", end='')
-        print(f"|{ending_balance.b10:3}", end='')
-        print(f"|{ending_balance.b20:3}", end='')
-        print(f"|{ending_balance.b50:3}", end='')
-        print(f"|{ending_balance.b100:4}", end='')
-        print(f"|{ending_balance.total}")
+        writer = bills_writer(label=("label", "ending balance"))
+        writer.write_header()
+        writer.write_row(ending_balance, "")
 
     if args.trial_run:
         print("Trial_run: Database not saved")
     else:
         print("Saving database")
-        save_database()
-        if not args.no_clear:
-            while (ans := input(f"Clear {recon_file}? (y) ").lower()) not in ("", "y", "yes", "n", "no"):
-                print('Looking for "", "y", "yes", "n" or "no"')
-            if ans in ("", "y", "yes"):
-                print("Clearing", recon_file)
-                with open(recon_file, "r") as file_in:
-                    table_name = file_in.readline()
-                    headers = file_in.readline()
-                with open(recon_file, "w") as file_out:
-                    print(table_name, end='', file=file_out)
-                    print(headers, end='', file=file_out)
-                return
-        print("Preserving", recon_file)
-
+        try:
+            save_appended(starting_num_rows, merge=True)
+        except Conflict_error as e:
+            print(e, file=sys.stderr)
+            print("Database not saved", file=sys.stderr)
+            sys.exit(1)
+        for recon_file in recon_files:
+            if not args.no_clear:
+                while (ans := input(f"Clear {recon_file}? (y) ").lower()) not in ("", "y", "yes", "n", "no"):
+                    print('Looking for "", "y", "yes", "n" or "no"')
+                if ans in ("", "y", "yes"):
+                    clear_file(recon_file)
+                    continue
+            print("Preserving", recon_file)
@@ -0,0 +1,63 @@
+# validate.py
+
+r'''Incremental foreign-key and constraint validation.
+
+Only the rows passed in are checked, against hash indexes of the referenced keys, so the cost is
+proportional to the number of new (or modified) rows rather than the size of the database.
+'''
+
+from .database import *
+
+
+class Validation_error(Exception):
+    r'''Carries all of the errors found as a list of (row_number, message) in self.errors.
+    '''
+    def __init__(self, table_name, errors):
+        self.table_name = table_name
+        self.errors = errors
+        super().__init__(f"{len(errors)} error(s) in {table_name}")
+
+    def __str__(self):
+        return "\n".join([super().__str__()] +
+                         [f"  row {row_number}: {msg}" for row_number, msg in self.errors])
+
+
+class Key_indexes:
+    r'''Hash indexes of the keys that Starts and Reconcile rows refer to.
+
+    Build one of these per batch; it only scans the (small) referenced tables.
+    '''
+    def __init__(self):
+        self.accounts = frozenset(row.account for row in Accounts.values())
+        self.ticket_prices = {row.name: row.int for row in Globals.values()}
+
+    def check(self, row, check_date=True):
+        r'''Generates error messages for `row`.
+        '''
+        if check_date and getattr(row, "date", None) is None:
+            yield "missing date"
+        account = row.account
+        if not account:
+            yield "missing account"
+            return
+        if account not in self.accounts:
+            yield f"unknown account {account!r}"
+        if account.endswith(" tickets"):
+            price_name = account[:-1] + " price"
+            if self.ticket_prices.get(price_name) is None:
+                yield f"no int {price_name!r} in Globals for {account!r}"
+
+
+def check_rows(table_name, numbered_rows, indexes=None):
+    r'''Checks each (row_number, row) in numbered_rows.
+
+    The rows only need account (and date, for Reconcile) attributes.  Returns a list of
+    (row_number, message) for all errors found.
+    '''
+    if indexes is None:
+        indexes = Key_indexes()
+    check_date = table_name == "Reconcile"
+    return [(row_number, msg)
+            for row_number, row in numbered_rows
+              for msg in indexes.check(row, check_date)]
+
@@ -0,0 +1,144 @@
+# watch.py
+
+r'''Watches a drop directory for Reconcile csv files and ingests them as they land.
+
+A file is ingested once its size and modification time haven't changed for `debounce` seconds.
+Each file is checked completely before any of it is imported, then its rows are appended to
+Reconcile and saved.  The file is then moved to the archive directory (or to archive/rejected if
+it has errors).
+
+The ingesting runs in a worker thread, one file at a time, so the event loop stays responsive.
+'''
+
+import asyncio
+import os
+import shutil
+import sys
+import time
+
+from .database import *
+from .importer import Importer
+from .validate import Validation_error
+
+
+def archive(path, archive_dir):
+    r'''Moves path into archive_dir, adding a timestamp to the name if it's already there.
+    '''
+    os.makedirs(archive_dir, exist_ok=True)
+    name = os.path.basename(path)
+    dest = os.path.join(archive_dir, name)
+    if os.path.exists(dest):
+        root, ext = os.path.splitext(name)
+        dest = os.path.join(archive_dir, f"{root}-{time.strftime('%Y%m%d-%H%M%S')}{ext}")
+    shutil.move(path, dest)
+    return dest
+
+
+class Watcher:
+    def __init__(self, drop_dir, archive_dir, debounce=2.0, poll=1.0, trial_run=False,
+                 allow_near_duplicates=False):
+        self.drop_dir = drop_dir
+        self.archive_dir = archive_dir
+        self.debounce = debounce
+        self.poll = poll
+        self.trial_run = trial_run
+        self.allow_near_duplicates = allow_near_duplicates
+        self.new_importer()
+        self.seen = {}          # {path: ((size, mtime), time first seen with that stat)}
+        self.queued = set()
+        self.queue = asyncio.Queue()
+
+    def scan(self):
+        r'''Returns a list of the paths in drop_dir that have settled.
+        '''
+        now = time.monotonic()
+        ready = []
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(".csv") or entry.path in self.queued:
+                    continue
+                st = entry.stat()
+                stat = st.st_size, st.st_mtime_ns
+                prev_stat, since = self.seen.get(entry.path, (None, now))
+                if stat != prev_stat:
+                    self.seen[entry.path] = stat, now
+                elif now - since >= self.debounce:
+                    ready.append(entry.path)
+        return sorted(ready)
+
+    async def watch(self):
+        while True:
+            for path in self.scan():
+                self.queued.add(path)
+                del self.seen[path]
+                await self.queue.put(path)
+            await asyncio.sleep(self.poll)
+
+    async def worker(self):
+        while True:
+            path = await self.queue.get()
+            try:
+                await asyncio.to_thread(self.ingest, path)
+            except Exception as e:
+                # Keep watching.  The file is moved out of the way so it isn't retried.
+                print(f"{path}: {e.__class__.__name__}: {e}", file=sys.stderr)
+                if os.path.exists(path):
+                    self.reject(path)
+            finally:
+                self.queued.discard(path)
+                self.queue.task_done()
+
+    def ingest(self, path):
+        try:
+            self.importer.check_file(path)
+        except Validation_error as e:
+            print(e, file=sys.stderr)
+            self.reject(path)
+            return
+        start_index = len(Reconcile)
+        try:
+            self.importer.import_file(path)
+            if self.trial_run:
+                print("Trial_run: Database not saved")
+            elif len(Reconcile) > start_index and save_appended(start_index, merge=True):
+                # The Tables were reloaded to merge someone else's changes.
+                self.new_importer()
+        except Validation_error as e:
+            print(e, file=sys.stderr)
+            self.rollback()
+            self.reject(path)
+            return
+        except BaseException:
+            self.rollback()
+            raise
+        print(f"{path} moved to {archive(path, self.archive_dir)}")
+
+    def new_importer(self):
+        self.importer = Importer(allow_near_duplicates=self.allow_near_duplicates)
+
+    def rollback(self):
+        r'''Drops the rows of a file that failed to import or save, by reloading the database.
+
+        Otherwise they'd stay in Reconcile, and the importer's duplicate index, and the file would
+        be skipped as a duplicate when it's dropped again.
+        '''
+        load_database(since="checkpoint")
+        self.new_importer()
+
+    def reject(self, path):
+        print(f"{path} moved to {archive(path, os.path.join(self.archive_dir, 'rejected'))}",
+              file=sys.stderr)
+
+    async def run(self):
+        print(f"Watching {self.drop_dir} (Ctrl-C to stop)")
+        await asyncio.gather(self.watch(), self.worker())
+
+
+def watch(drop_dir, archive_dir, **kws):
+    r'''Runs until interrupted.  The database must already be loaded.
+    '''
+    watcher = Watcher(drop_dir, archive_dir, **kws)
+    try:
+        asyncio.run(watcher.run())
+    except KeyboardInterrupt:
+        print("Stopped watching", drop_dir)
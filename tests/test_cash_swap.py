@@ -0,0 +1,47 @@
+# test_cash_swap.py
+
+from decimal import Decimal
+import random
+
+import pytest
+
+pytest.importorskip("csv_app")
+
+from csv_beans.cash_swap import (Bill_names, bills, plan_swap, optimal_swap, meets,
+                                 exchangeable_surplus, bills_exchanged)
+
+
+def final_counts(balance, swap):
+    cash_out, cash_in = swap
+    final = balance - cash_out + cash_in
+    return final, tuple(getattr(final, name) for name in Bill_names)
+
+
+def test_two_20s_and_a_10_make_a_50():
+    balance = bills(0, 0, 0, 1, 3, 0, 0)
+    zero = bills()
+    final, counts = final_counts(balance, optimal_swap(balance, zero))
+    assert (final.b10, final.b20, final.b50) == (0, 1, 1)
+    greedy, _ = final_counts(balance, plan_swap(balance, zero))
+    assert greedy.b50 == 1
+
+
+def test_optimal_swap_never_leaves_an_exchangeable_surplus():
+    rng = random.Random(0)
+    for _ in range(2000):
+        balance = bills(Decimal(rng.randrange(1000)) / 100, *(rng.randrange(40) for _ in range(6)))
+        minimums = bills(rng.randrange(5), *(rng.randrange(15) for _ in range(6)))
+        swap = optimal_swap(balance, minimums)
+        if swap is None:
+            continue
+        final, counts = final_counts(balance, swap)
+        assert final.total == balance.total
+        assert meets(final, minimums)
+        assert exchangeable_surplus(counts, [getattr(minimums, name) for name in Bill_names]) \
+               is None
+        greedy = plan_swap(balance, minimums)
+        greedy_final, greedy_counts = final_counts(balance, greedy)
+        if meets(greedy_final, minimums) \
+           and exchangeable_surplus(greedy_counts,
+                                    [getattr(minimums, name) for name in Bill_names]) is None:
+            assert bills_exchanged(*swap) <= bills_exchanged(*greedy)
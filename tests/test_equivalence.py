@@ -0,0 +1,23 @@
+# test_equivalence.py
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("csv_app")
+
+from csv_beans.equivalence import generate_history, run_checks
+
+
+Template = Path(__file__).parent.parent / "csv_beans" / "beans.csv"
+
+
+def test_generated_history_matches_reference(tmp_path):
+    filename = str(tmp_path / "generated.csv")
+    generate_history(Template, filename, 3000, seed=0)
+    checks = []
+    for check, (num_values, errors, ref_seconds, seconds) in run_checks(filename):
+        checks.append(check)
+        assert num_values, f"{check}: nothing compared"
+        assert not errors, f"{check}: {len(errors)} mismatches, first: {errors[0]}"
+    assert {"parse", "totals", "ledger", "report", "balances"} <= set(checks)
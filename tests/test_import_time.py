@@ -0,0 +1,22 @@
+# test_import_time.py
+
+import os
+
+import pytest
+
+pytest.importorskip("csv_app")
+
+from csv_beans.import_bench import Budget_ms, Forbidden, bench, script_modules
+
+
+Pyproject = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pyproject.toml")
+
+
+@pytest.mark.parametrize("script, module", sorted(script_modules(Pyproject).items()))
+def test_script_imports_within_budget(script, module):
+    result = bench(module, 3)
+    assert result is not None, f"{script}: import {module} failed"
+    ms, imported = result
+    assert ms <= Budget_ms, f"{script}: {ms:.1f} ms to import {module}, budget {Budget_ms:.0f} ms"
+    for name in Forbidden:
+        assert name not in imported, f"{script}: import {module} imports {name}"
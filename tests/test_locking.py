@@ -0,0 +1,91 @@
+# test_locking.py
+
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("csv_app")
+
+from csv_beans import tables
+from csv_beans.database import *
+
+
+Template = Path(__file__).parent.parent / "csv_beans" / "beans.csv"
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    r'''A copy of the repo's beans.csv, loaded, with one row added here.
+    '''
+    filename = tmp_path / "beans.csv"
+    filename.write_text(Template.read_text())
+    monkeypatch.setattr(tables, "Database_filename", str(filename))
+    load_database()
+    Reconcile.insert(date=date(2026, 12, 30), account="50/50", detail="Raffle",
+                     coin=Decimal(0), b1=5, donations=Decimal(0))
+    return filename
+
+
+def saved_elsewhere(filename, *lines):
+    r'''Someone else adds lines to the end of Reconcile, the last table in the file.
+    '''
+    text = filename.read_text()
+    assert text.rstrip().split("\n\n")[-1].startswith("Reconcile\n")
+    filename.write_text(text.rstrip("\n") + "\n" + "\n".join(lines) + "\n\n")
+
+
+def reconcile_rows(filename):
+    return [(row["date"], row["account"], row["detail"], row["b1"], row["donations"])
+            for row in tables.read_csv_database(str(filename))["Reconcile"]]
+
+
+def test_merge(database):
+    num_rows = len(reconcile_rows(database))
+    saved_elsewhere(database, "Dec 29, 26|50/50|Other|0|3|0|0|0|0|0|0")
+    assert save_database(merge=True)
+    rows = reconcile_rows(database)
+    assert len(rows) == num_rows + 2
+    assert rows[-2:] == [(date(2026, 12, 29), "50/50", "Other", 3, 0),
+                         (date(2026, 12, 30), "50/50", "Raffle", 5, 0)]
+    assert len(Reconcile) == num_rows + 2
+    assert not save_database()
+
+
+def test_exact_duplicate_dropped(database):
+    num_rows = len(reconcile_rows(database))
+    saved_elsewhere(database, "Dec 30, 26|50/50|Raffle|0|5|0|0|0|0|0|0")
+    assert save_database(merge=True)
+    rows = reconcile_rows(database)
+    assert len(rows) == num_rows + 1
+    assert rows[-1] == (date(2026, 12, 30), "50/50", "Raffle", 5, 0)
+
+
+def test_near_duplicate_conflict(database):
+    saved_elsewhere(database, "Dec 30, 26|50/50|raffle|0|5|0|0|0|0|0|2")
+    theirs = database.read_text()
+    num_rows = len(Reconcile)
+    loaded_version = tables.loaded_version
+    with pytest.raises(Conflict_error, match="near duplicate"):
+        save_database(merge=True)
+    assert database.read_text() == theirs
+    assert len(Reconcile) == num_rows
+    assert Reconcile[-1].detail == "Raffle"
+    assert tables.loaded_version == loaded_version
+
+
+def test_small_table_conflict(database):
+    last = Months.last_month()
+    Months.insert(year=last.year + 1, month=last.month, start_date=date(2027, 1, 1))
+    saved_elsewhere(database, "Dec 29, 26|50/50|Other|0|3|0|0|0|0|0|0")
+    theirs = database.read_text()
+    with pytest.raises(Conflict_error, match="Months"):
+        save_database(merge=True)
+    assert database.read_text() == theirs
+
+
+def test_conflict_without_merge(database):
+    saved_elsewhere(database, "Dec 29, 26|50/50|Other|0|3|0|0|0|0|0|0")
+    with pytest.raises(Conflict_error):
+        save_database()
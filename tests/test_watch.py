@@ -0,0 +1,52 @@
+# test_watch.py
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("csv_app")
+
+from csv_beans import tables
+from csv_beans.database import *
+from csv_beans.watch import Watcher
+
+
+Template = Path(__file__).parent.parent / "csv_beans" / "beans.csv"
+
+Drop = """Reconcile
+date|account|detail|coin|b1|b5|b10|b20|b50|b100|donations
+Dec 30, 26|50/50|Raffle|0|5|0|0|0|0|0|0
+"""
+
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    filename = tmp_path / "beans.csv"
+    filename.write_text(Template.read_text())
+    monkeypatch.setattr(tables, "Database_filename", str(filename))
+    load_database(since="checkpoint")
+    (tmp_path / "drop").mkdir()
+    return Watcher(str(tmp_path / "drop"), str(tmp_path / "archive"))
+
+
+def test_failed_save_is_rolled_back(watcher, tmp_path, monkeypatch):
+    num_rows = len(Reconcile)
+    atomic_save = tables.atomic_save
+
+    def fail(filename, save):
+        monkeypatch.setattr(tables, "atomic_save", atomic_save)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(tables, "atomic_save", fail)
+    path = tmp_path / "drop" / "raffle.csv"
+    path.write_text(Drop)
+    with pytest.raises(OSError):
+        watcher.ingest(str(path))
+    assert len(Reconcile) == num_rows
+
+    # Dropped again, it's imported rather than skipped as a duplicate.
+    watcher.ingest(str(path))
+    assert not path.exists()
+    load_database()
+    assert len(Reconcile) == num_rows + 1
+    assert (Reconcile[-1].account, Reconcile[-1].detail, Reconcile[-1].b1) == ("50/50", "Raffle", 5)